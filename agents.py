@@ -0,0 +1,362 @@
+"""Multi-agent analysis core, independent of the Streamlit UI"""
+import asyncio
+import json
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Union
+
+from PIL import Image
+
+from backends import BackendRouter
+from ensemble import default_quorum, merge_samples, quorum_reached
+from preprocess import PreparedImage, encode_jpeg
+from prompts import AGENT_PROMPTS, agent_fingerprint, build_vision_messages, build_treatment_messages, usage_summary
+
+if TYPE_CHECKING:
+    import httpx
+
+# Sampling temperature for ensemble samples; at the default temperature the
+# samples are too correlated for voting to add information
+ENSEMBLE_TEMPERATURE = 0.7
+
+# The image agents whose findings feed the treatment coordinator
+VISION_AGENTS = ("pathology", "entomology", "nutrition", "environmental")
+
+
+def _treatment_input(result: Dict[str, Any]) -> Dict[str, Any]:
+    """What the treatment coordinator sees of an image agent's result"""
+    # Vote bookkeeping is for the UI, not the coordinator
+    return {k: v for k, v in result.items() if k != "ensemble"}
+
+
+class TomatoAnalysisAgent:
+    """Multi-agent system for comprehensive plant disease analysis"""
+    
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 http_client: Optional["httpx.Client"] = None, router: Optional[BackendRouter] = None):
+        # base_url/http_client let the agents run against a local stub server
+        # or a record/replay transport instead of the live API; a router sends
+        # each agent to its own backend and model
+        self.router = router or BackendRouter.single(api_key, base_url, http_client=http_client)
+        self.usage: Dict[str, Dict[str, Any]] = {}
+        
+    def encode_image(self, image: Image.Image) -> str:
+        """Convert PIL Image to base64 string"""
+        return encode_jpeg(image)
+    
+    def _image_payload(self, image: Union[Image.Image, PreparedImage]) -> List[str]:
+        """Base64 images to attach; a PreparedImage is encoded once and shared by all agents"""
+        if isinstance(image, PreparedImage):
+            return image.payload()
+        return [self.encode_image(image)]
+    
+    def _record_usage(self, agent_key: str, *responses: Any):
+        """Keep per-agent token usage, including the prompt-cache hit ratio"""
+        summaries = [usage_summary(r.usage) for r in responses if getattr(r, "usage", None) is not None]
+        if summaries:
+            backend = self.router.backend_for(agent_key)
+            totals = {
+                field: sum(summary[field] for summary in summaries)
+                for field in ("prompt_tokens", "completion_tokens", "cached_tokens")
+            }
+            prompt_tokens = totals["prompt_tokens"]
+            self.usage[agent_key] = {
+                **totals,
+                "cached_ratio": round(totals["cached_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0,
+                "calls": len(summaries),
+                "backend": backend.name,
+                "model": backend.model,
+            }
+    
+    def _complete(self, agent_key: str, messages: List[Dict[str, Any]], max_tokens: int) -> Dict[str, Any]:
+        """Send one agent's request to its configured backend and parse the JSON reply"""
+        backend = self.router.backend_for(agent_key)
+        response = self.router.client(backend).chat.completions.create(
+            model=backend.model,
+            messages=messages,
+            max_tokens=max_tokens
+        )
+        self._record_usage(agent_key, response)
+        
+        content = response.choices[0].message.content
+        return self._parse_json_response(content)
+    
+    def _run_vision_agent(self, agent_key: str, image: Union[Image.Image, PreparedImage]) -> Dict[str, Any]:
+        """Run one image agent using its prompt from the registry"""
+        prompt = AGENT_PROMPTS[agent_key]
+        
+        try:
+            base64_images = self._image_payload(image)
+            return self._complete(agent_key, build_vision_messages(prompt, base64_images), prompt.max_tokens)
+        except Exception as e:
+            return {"error": str(e), "agent_name": prompt.agent_name}
+    
+    def pathology_agent(self, image: Union[Image.Image, PreparedImage], samples: int = 1,
+                        quorum: Optional[int] = None) -> Dict[str, Any]:
+        """Plant Pathology Specialist Agent; with samples > 1 the diagnosis is voted on"""
+        if samples > 1:
+            return self.pathology_ensemble(image, samples, quorum)
+        return self._run_vision_agent("pathology", image)
+    
+    def pathology_ensemble(self, image: Union[Image.Image, PreparedImage], samples: int = 3,
+                           quorum: Optional[int] = None) -> Dict[str, Any]:
+        """Sample the pathology agent concurrently and merge the samples by voting.
+        
+        All samples are requested at once and counted as they complete;
+        requests still in flight are cancelled as soon as `quorum` samples (a
+        simple majority by default) agree on the primary diagnosis. When
+        replaying cassettes every recorded sample is counted instead, so the
+        vote matches the recording whatever order the replies arrive in.
+        """
+        prompt = AGENT_PROMPTS["pathology"]
+        quorum = quorum or default_quorum(samples)
+        
+        try:
+            messages = build_vision_messages(prompt, self._image_payload(image))
+            return asyncio.run(self._vote("pathology", messages, prompt.max_tokens, samples, quorum))
+        except Exception as e:
+            return {"error": str(e), "agent_name": prompt.agent_name}
+    
+    async def _vote(self, agent_key: str, messages: List[Dict[str, Any]], max_tokens: int,
+                    samples: int, quorum: int) -> Dict[str, Any]:
+        backend = self.router.backend_for(agent_key)
+        client = self.router.create_async_client(backend)
+        # Separate requests rather than n=samples so unneeded samples can be
+        # cancelled; the shared prefix is served from the prompt cache. Distinct
+        # seeds keep the samples reproducible and their cassette keys apart.
+        seeds = {
+            asyncio.ensure_future(client.chat.completions.create(
+                model=backend.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=ENSEMBLE_TEMPERATURE,
+                seed=seed,
+            )): seed
+            for seed in range(samples)
+        }
+        pending = set(seeds)
+        responses, voted, errors = [], [], []
+        cancelled = 0
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Everything that finished together votes; it has been paid for
+                for task in sorted(done, key=seeds.get):
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        if self.router.replay and getattr(e, "type", None) == "cassette_miss":
+                            # Not recorded: the sample was cancelled (or failed) in the recording
+                            cancelled += 1
+                        else:
+                            errors.append(str(e))
+                        continue
+                    responses.append(response)
+                    result = self._parse_json_response(response.choices[0].message.content)
+                    if "parsing_error" in result:
+                        errors.append(result["parsing_error"])
+                        continue
+                    voted.append((seeds[task], result))
+                if not self.router.replay and quorum_reached([result for _, result in voted], quorum):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await client.close()
+        
+        for task in pending:
+            if task.cancelled():
+                cancelled += 1
+            elif task.exception() is not None:
+                errors.append(str(task.exception()))
+            else:
+                # Finished while being cancelled: billed, but not part of the vote
+                responses.append(task.result())
+        
+        self._record_usage(agent_key, *responses)
+        if not voted:
+            raise RuntimeError(f"No {agent_key} sample succeeded: {errors[0] if errors else 'unknown error'}")
+        # Merge in seed order so ties break the same way on every run
+        results = [result for _, result in sorted(voted, key=lambda entry: entry[0])]
+        return merge_samples(results, samples, quorum, failed=len(errors), cancelled=cancelled)
+    
+    def entomology_agent(self, image: Union[Image.Image, PreparedImage]) -> Dict[str, Any]:
+        """Entomology Specialist Agent for pest damage"""
+        return self._run_vision_agent("entomology", image)
+    
+    def nutrition_agent(self, image: Union[Image.Image, PreparedImage]) -> Dict[str, Any]:
+        """Plant Nutrition Specialist Agent"""
+        return self._run_vision_agent("nutrition", image)
+    
+    def environmental_agent(self, image: Union[Image.Image, PreparedImage]) -> Dict[str, Any]:
+        """Environmental Stress Specialist Agent"""
+        return self._run_vision_agent("environmental", image)
+    
+    def treatment_agent(self, pathology_data: Dict, entomology_data: Dict, 
+                       nutrition_data: Dict, environmental_data: Dict) -> Dict[str, Any]:
+        """Treatment Coordinator Agent"""
+        prompt = AGENT_PROMPTS["treatment"]
+        findings = {
+            "pathology": _treatment_input(pathology_data),
+            "entomology": entomology_data,
+            "nutrition": nutrition_data,
+            "environmental": environmental_data,
+        }
+        
+        try:
+            return self._complete("treatment", build_treatment_messages(prompt, findings), prompt.max_tokens)
+        except Exception as e:
+            return {"error": str(e), "agent_name": prompt.agent_name}
+    
+    def _parse_json_response(self, content: str) -> Dict[str, Any]:
+        """Parse JSON from response content"""
+        try:
+            # Try to find JSON in the response
+            start_idx = content.find('{')
+            end_idx = content.rfind('}') + 1
+            if start_idx != -1 and end_idx > start_idx:
+                json_str = content[start_idx:end_idx]
+                return json.loads(json_str)
+            else:
+                # If no JSON found, create a fallback response
+                return {
+                    "raw_response": content,
+                    "parsing_error": "No valid JSON found in response",
+                    "agent_name": "Unknown"
+                }
+        except json.JSONDecodeError as e:
+            return {
+                "raw_response": content,
+                "parsing_error": f"JSON decode error: {str(e)}",
+                "agent_name": "Unknown"
+            }
+    
+    def run_multi_agent_analysis(self, image: Union[Image.Image, PreparedImage],
+                                 pathology_samples: int = 1) -> Dict[str, Any]:
+        """Run all agents sequentially for comprehensive analysis"""
+        
+        results = {}
+        self.usage = {}
+        # Encode once for all four image agents
+        if not isinstance(image, PreparedImage):
+            image = PreparedImage.from_image(image)
+        
+        try:
+            # Run pathology agent
+            results["pathology"] = self.pathology_agent(image, samples=pathology_samples)
+            
+            # Run entomology agent
+            results["entomology"] = self.entomology_agent(image)
+            
+            # Run nutrition agent
+            results["nutrition"] = self.nutrition_agent(image)
+            
+            # Run environmental agent
+            results["environmental"] = self.environmental_agent(image)
+            
+            # Run treatment coordinator with all results
+            results["treatment"] = self.treatment_agent(
+                results["pathology"], results["entomology"], 
+                results["nutrition"], results["environmental"]
+            )
+            
+            results["usage"] = self.usage
+            results["fingerprints"] = self.fingerprints(pathology_samples)
+            results["analysis_timestamp"] = datetime.now().isoformat()
+            return results
+            
+        except Exception as e:
+            return {"error": f"Multi-agent analysis failed: {str(e)}"}
+    
+    def fingerprints(self, pathology_samples: int = 1) -> Dict[str, str]:
+        """Current fingerprint of every agent: its prompt, routed model and request parameters"""
+        fingerprints = {}
+        for agent_key, prompt in AGENT_PROMPTS.items():
+            params = {}
+            if agent_key == "pathology" and pathology_samples > 1:
+                params = {"samples": pathology_samples, "temperature": ENSEMBLE_TEMPERATURE}
+            fingerprints[agent_key] = agent_fingerprint(prompt, self.router.backend_for(agent_key).model, params)
+        return fingerprints
+    
+    @staticmethod
+    def previous_samples(previous: Dict[str, Any]) -> int:
+        """Pathology sample count a stored analysis was run with"""
+        return previous.get("pathology", {}).get("ensemble", {}).get("requested", 1)
+    
+    def stale_agents(self, previous: Dict[str, Any], pathology_samples: Optional[int] = None) -> List[str]:
+        """Agents whose stored result is missing, failed, or was made with a different fingerprint.
+        
+        The treatment coordinator is listed only if its own fingerprint
+        changed; it also re-runs when any of its inputs is recomputed with a
+        different outcome, which is not known in advance.
+        """
+        if pathology_samples is None:
+            pathology_samples = self.previous_samples(previous)
+        current = self.fingerprints(pathology_samples)
+        stored = previous.get("fingerprints", {})
+        return [
+            agent_key for agent_key in AGENT_PROMPTS
+            if stored.get(agent_key) != current[agent_key]
+            or not isinstance(previous.get(agent_key), dict)
+            or "error" in previous[agent_key]
+        ]
+    
+    def reanalyze(self, image: Union[Image.Image, PreparedImage], previous: Dict[str, Any],
+                  pathology_samples: Optional[int] = None, force: bool = False) -> Dict[str, Any]:
+        """Re-run only the agents whose fingerprint changed since `previous`.
+        
+        Up-to-date results are carried over, with their recorded usage marked
+        as reused. The treatment coordinator re-runs if its own fingerprint
+        changed or any of its inputs differs from the stored one. With `force`
+        every agent runs. The returned results list what was recomputed
+        under "reanalysis".
+        """
+        if pathology_samples is None:
+            pathology_samples = self.previous_samples(previous)
+        stale = list(AGENT_PROMPTS) if force else self.stale_agents(previous, pathology_samples)
+        
+        results = {}
+        self.usage = {}
+        if not isinstance(image, PreparedImage):
+            image = PreparedImage.from_image(image)
+        
+        try:
+            for agent_key in VISION_AGENTS:
+                if agent_key not in stale:
+                    results[agent_key] = previous[agent_key]
+                elif agent_key == "pathology":
+                    results[agent_key] = self.pathology_agent(image, samples=pathology_samples)
+                else:
+                    results[agent_key] = self._run_vision_agent(agent_key, image)
+            
+            recomputed = [agent_key for agent_key in VISION_AGENTS if agent_key in stale]
+            inputs_changed = any(
+                _treatment_input(results[agent_key]) != _treatment_input(previous.get(agent_key, {}))
+                for agent_key in recomputed
+            )
+            if "treatment" in stale or inputs_changed:
+                recomputed.append("treatment")
+                results["treatment"] = self.treatment_agent(
+                    results["pathology"], results["entomology"],
+                    results["nutrition"], results["environmental"]
+                )
+            else:
+                results["treatment"] = previous["treatment"]
+            
+            usage = dict(self.usage)
+            for agent_key, stats in previous.get("usage", {}).items():
+                if agent_key not in recomputed:
+                    usage[agent_key] = {**stats, "reused": True}
+            
+            results["usage"] = usage
+            results["fingerprints"] = self.fingerprints(pathology_samples)
+            results["reanalysis"] = {
+                "recomputed": recomputed,
+                "reused": [agent_key for agent_key in AGENT_PROMPTS if agent_key not in recomputed],
+                "previous_timestamp": previous.get("analysis_timestamp"),
+            }
+            results["analysis_timestamp"] = datetime.now().isoformat()
+            return results
+            
+        except Exception as e:
+            return {"error": f"Re-analysis failed: {str(e)}"}
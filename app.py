@@ -1,19 +1,25 @@
-import sys
-import importlib
-importlib.import_module('pysqlite3')
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
-import streamlit as st
-import openai
-from PIL import Image
-import base64
-import io
 import json
+import os
 from datetime import datetime
-import pandas as pd
+from functools import partial
 from typing import Dict, Any, List
-import os
+
+import streamlit as st
 from dotenv import load_dotenv
 
+from backends import BackendRouter, load_backend_config
+from lazy_imports import alias_module_lazily
+from prompts import AGENT_PROMPTS
+from sidebar_content import AGENT_CAPABILITIES, DISEASE_REFERENCE, IMAGE_GUIDELINES
+
+# Heavy modules (openai, numpy, PIL, PyAV and the agent/preprocessing code that
+# pulls them in) are imported inside the functions that first need them, so a
+# cold start only pays for Streamlit itself. Run benchmarks/bench_startup.py
+# to check the import budget.
+
+# Serve `import sqlite3` from pysqlite3, but only if something imports it
+alias_module_lazily('sqlite3', 'pysqlite3')
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -45,404 +51,16 @@ hide_footer_style = """
 
 st.markdown(hide_footer_style, unsafe_allow_html=True)
 
-class TomatoAnalysisAgent:
-    """Multi-agent system for comprehensive plant disease analysis"""
-    
-    def __init__(self, api_key: str):
-        self.client = openai.OpenAI(api_key=api_key)
-        
-    def encode_image(self, image: Image.Image) -> str:
-        """Convert PIL Image to base64 string"""
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        return img_str
-    
-    def pathology_agent(self, image: Image.Image) -> Dict[str, Any]:
-        """Plant Pathology Specialist Agent"""
-        base64_image = self.encode_image(image)
-        
-        prompt = """
-        You are Dr. Sarah Chen, a world-renowned plant pathologist with 20 years of experience in tomato diseases.
-        
-        Analyze this tomato leaf image for diseases. Focus on:
-        
-        FUNGAL DISEASES:
-        - Early Blight (Alternaria solani) - brown spots with concentric rings
-        - Late Blight (Phytophthora infestans) - water-soaked lesions
-        - Septoria Leaf Spot - small circular spots with gray centers
-        - Target Spot (Corynespora cassiicola) - circular lesions with target pattern
-        - Anthracnose - sunken lesions on mature fruit
-        - Powdery Mildew - white powdery coating
-        - Downy Mildew - yellow patches with fuzzy growth
-        - Fusarium Wilt - yellowing and wilting from bottom up
-        - Verticillium Wilt - V-shaped yellowing
-        - Black Mold (Alternaria alternata) - dark lesions
-        - Gray Mold (Botrytis cinerea) - gray fuzzy growth
-        - Leaf Mold (Passalora fulva) - olive-green patches
-        
-        BACTERIAL DISEASES:
-        - Bacterial Spot (Xanthomonas) - small dark spots with yellow halos
-        - Bacterial Speck (Pseudomonas syringae) - tiny black spots
-        - Bacterial Wilt (Ralstonia solanacearum) - sudden wilting
-        - Bacterial Canker (Clavibacter michiganensis) - cankers on stems
-        - Pith Necrosis - hollow brown pith in stems
-        
-        VIRAL DISEASES:
-        - Tomato Mosaic Virus (ToMV) - mottled yellow-green patterns
-        - Tobacco Mosaic Virus (TMV) - mosaic patterns
-        - Tomato Spotted Wilt Virus - bronze spots and rings
-        - Cucumber Mosaic Virus - stunted growth, mottling
-        - Tomato Yellow Leaf Curl Virus - upward curling leaves
-        - Tomato Bushy Stunt Virus - stunted bushy growth
-        
-        Provide analysis in JSON format:
-        {
-            "agent_name": "Plant Pathology Specialist",
-            "diseases_identified": ["list of diseases with confidence %"],
-            "pathogen_type": "fungal/bacterial/viral/physiological",
-            "disease_stage": "early/intermediate/advanced",
-            "severity_score": "1-10 scale",
-            "key_symptoms": ["detailed symptom list"],
-            "differential_diagnosis": ["possible alternative diseases"],
-            "prognosis": "likely outcome if untreated"
-        }
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a plant pathology expert. Always respond with valid JSON."},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
-                                    "detail": "high"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1200
-            )
-            
-            content = response.choices[0].message.content
-            return self._parse_json_response(content)
-            
-        except Exception as e:
-            return {"error": str(e), "agent_name": "Plant Pathology Specialist"}
-    
-    def entomology_agent(self, image: Image.Image) -> Dict[str, Any]:
-        """Entomology Specialist Agent for pest damage"""
-        base64_image = self.encode_image(image)
-        
-        prompt = """
-        You are Dr. Marcus Rodriguez, an entomologist specializing in tomato pests and their damage patterns.
-        
-        Analyze this image for pest damage signs:
-        
-        INSECT PESTS:
-        - Hornworms - large holes, black droppings
-        - Cutworms - stems cut at soil level
-        - Aphids - yellowing, sticky honeydew, curled leaves
-        - Whiteflies - yellowing, stunted growth
-        - Thrips - silver streaks, black specks
-        - Spider Mites - stippling, webbing, bronze appearance
-        - Flea Beetles - small round holes
-        - Colorado Potato Beetles - large irregular holes
-        - Leaf Miners - serpentine tunnels in leaves
-        - Stink Bugs - cloudy spot on fruit, feeding damage
-        - Psyllids - yellowing, twisted growth
-        - Scale Insects - yellow spots, honeydew
-        
-        MITE DAMAGE:
-        - Two-spotted Spider Mites - stippling, webbing
-        - Broad Mites - distorted growth, bronzing
-        - Cyclamen Mites - stunted, distorted leaves
-        
-        OTHER ARTHROPODS:
-        - Slugs/Snails - irregular holes, slime trails
-        - Nematodes - root galls, stunted growth
-        
-        Provide JSON analysis:
-        {
-            "agent_name": "Entomology Specialist",
-            "pest_damage_detected": ["list of pest damage with confidence %"],
-            "damage_pattern": "description of feeding damage",
-            "pest_lifecycle_stage": "egg/larva/adult damage",
-            "infestation_level": "light/moderate/heavy",
-            "secondary_issues": ["diseases that follow pest damage"],
-            "beneficial_insects": ["predators that might help"]
-        }
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an entomology expert. Always respond with valid JSON."},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
-                                    "detail": "high"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000
-            )
-            
-            content = response.choices[0].message.content
-            return self._parse_json_response(content)
-            
-        except Exception as e:
-            return {"error": str(e), "agent_name": "Entomology Specialist"}
-    
-    def nutrition_agent(self, image: Image.Image) -> Dict[str, Any]:
-        """Plant Nutrition Specialist Agent"""
-        base64_image = self.encode_image(image)
-        
-        prompt = """
-        You are Dr. Lisa Thompson, a plant nutrition expert specializing in tomato nutrient disorders.
-        
-        Analyze this image for nutritional deficiencies and disorders:
-        
-        NUTRIENT DEFICIENCIES:
-        - Nitrogen (N) - yellowing of older leaves, stunted growth
-        - Phosphorus (P) - purple/reddish leaves, poor fruit development
-        - Potassium (K) - leaf edge burn, poor fruit quality
-        - Calcium (Ca) - blossom end rot, tip burn
-        - Magnesium (Mg) - interveinal yellowing of older leaves
-        - Iron (Fe) - interveinal yellowing of young leaves
-        - Manganese (Mn) - interveinal yellowing, brown spots
-        - Zinc (Zn) - small leaves, shortened internodes
-        - Boron (B) - brittle leaves, poor fruit set
-        - Copper (Cu) - wilting, blue-green leaves
-        - Sulfur (S) - yellowing of young leaves
-        - Molybdenum (Mo) - yellowing, cupping of leaves
-        
-        PHYSIOLOGICAL DISORDERS:
-        - Blossom End Rot - calcium deficiency/water stress
-        - Catfacing - temperature/nutrition issues
-        - Cracking - water fluctuations
-        - Sunscald - excessive heat/light exposure
-        - Edema - overwatering, poor drainage
-        - Puffiness - cool temperatures, poor pollination
-        
-        Provide JSON analysis:
-        {
-            "agent_name": "Plant Nutrition Specialist",
-            "nutrient_deficiencies": ["deficiencies with severity %"],
-            "physiological_disorders": ["disorders identified"],
-            "soil_ph_indication": "acidic/neutral/alkaline suggestion",
-            "fertilizer_recommendations": ["specific nutrient needs"],
-            "environmental_factors": ["contributing conditions"]
-        }
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a plant nutrition expert. Always respond with valid JSON."},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
-                                    "detail": "high"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000
-            )
-            
-            content = response.choices[0].message.content
-            return self._parse_json_response(content)
-            
-        except Exception as e:
-            return {"error": str(e), "agent_name": "Plant Nutrition Specialist"}
-    
-    def environmental_agent(self, image: Image.Image) -> Dict[str, Any]:
-        """Environmental Stress Specialist Agent"""
-        base64_image = self.encode_image(image)
-        
-        prompt = """
-        You are Dr. Ahmed Hassan, an environmental plant stress specialist.
-        
-        Analyze this image for environmental stress factors:
-        
-        ABIOTIC STRESS:
-        - Heat Stress - leaf curling, wilting, sunscald
-        - Cold Stress - purple/blue coloration, stunted growth
-        - Water Stress - wilting, leaf drop, blossom end rot
-        - Light Stress - etiolation, sunscald, poor color
-        - Wind Damage - torn leaves, broken stems
-        - Hail Damage - puncture wounds, bruising
-        - Chemical Burn - leaf margins, spotting
-        - Salt Stress - leaf burn, stunted growth
-        - Oxygen Stress - yellowing, root problems
-        - Transplant Shock - wilting, yellowing
-        
-        ENVIRONMENTAL CONDITIONS:
-        - Humidity Issues - fungal problems, poor pollination
-        - Air Circulation - disease pressure, poor growth
-        - Soil Compaction - stunted roots, yellowing
-        - pH Problems - nutrient lockout, poor growth
-        - Contamination - unusual symptoms, poor health
-        
-        Provide JSON analysis:
-        {
-            "agent_name": "Environmental Stress Specialist",
-            "stress_factors": ["environmental stresses with severity"],
-            "climate_conditions": ["likely growing conditions"],
-            "soil_conditions": ["soil health indicators"],
-            "water_management": ["irrigation recommendations"],
-            "microclimate_factors": ["local environment issues"]
-        }
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an environmental stress expert. Always respond with valid JSON."},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
-                                    "detail": "high"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000
-            )
-            
-            content = response.choices[0].message.content
-            return self._parse_json_response(content)
-            
-        except Exception as e:
-            return {"error": str(e), "agent_name": "Environmental Stress Specialist"}
-    
-    def treatment_agent(self, pathology_data: Dict, entomology_data: Dict, 
-                       nutrition_data: Dict, environmental_data: Dict) -> Dict[str, Any]:
-        """Treatment Coordinator Agent"""
-        
-        prompt = f"""
-        You are Dr. Jennifer Park, an integrated pest management specialist and treatment coordinator.
-        
-        Based on the following multi-agent analysis results, provide comprehensive treatment recommendations:
-        
-        PATHOLOGY FINDINGS: {json.dumps(pathology_data, indent=2)}
-        ENTOMOLOGY FINDINGS: {json.dumps(entomology_data, indent=2)}
-        NUTRITION FINDINGS: {json.dumps(nutrition_data, indent=2)}
-        ENVIRONMENTAL FINDINGS: {json.dumps(environmental_data, indent=2)}
-        
-        Provide integrated treatment plan in JSON format:
-        {{
-            "agent_name": "Treatment Coordinator",
-            "priority_treatments": ["immediate actions needed"],
-            "organic_treatments": ["natural/organic solutions"],
-            "chemical_treatments": ["conventional options if needed"],
-            "cultural_practices": ["growing practice changes"],
-            "prevention_strategies": ["long-term prevention"],
-            "monitoring_schedule": ["what to watch for"],
-            "treatment_timeline": ["when to apply treatments"],
-            "resistance_management": ["avoiding resistance issues"],
-            "integrated_approach": ["holistic management strategy"]
-        }}
-        """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an integrated treatment specialist. Always respond with valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1200
-            )
-            
-            content = response.choices[0].message.content
-            return self._parse_json_response(content)
-            
-        except Exception as e:
-            return {"error": str(e), "agent_name": "Treatment Coordinator"}
-    
-    def _parse_json_response(self, content: str) -> Dict[str, Any]:
-        """Parse JSON from response content"""
-        try:
-            # Try to find JSON in the response
-            start_idx = content.find('{')
-            end_idx = content.rfind('}') + 1
-            if start_idx != -1 and end_idx > start_idx:
-                json_str = content[start_idx:end_idx]
-                return json.loads(json_str)
-            else:
-                # If no JSON found, create a fallback response
-                return {
-                    "raw_response": content,
-                    "parsing_error": "No valid JSON found in response",
-                    "agent_name": "Unknown"
-                }
-        except json.JSONDecodeError as e:
-            return {
-                "raw_response": content,
-                "parsing_error": f"JSON decode error: {str(e)}",
-                "agent_name": "Unknown"
-            }
-    
-    def run_multi_agent_analysis(self, image: Image.Image) -> Dict[str, Any]:
-        """Run all agents sequentially for comprehensive analysis"""
-        
-        results = {}
-        
-        try:
-            # Run pathology agent
-            results["pathology"] = self.pathology_agent(image)
-            
-            # Run entomology agent
-            results["entomology"] = self.entomology_agent(image)
-            
-            # Run nutrition agent
-            results["nutrition"] = self.nutrition_agent(image)
-            
-            # Run environmental agent
-            results["environmental"] = self.environmental_agent(image)
-            
-            # Run treatment coordinator with all results
-            results["treatment"] = self.treatment_agent(
-                results["pathology"], results["entomology"], 
-                results["nutrition"], results["environmental"]
-            )
-            
-            results["analysis_timestamp"] = datetime.now().isoformat()
-            return results
-            
-        except Exception as e:
-            return {"error": f"Multi-agent analysis failed: {str(e)}"}
+# Long side of the on-screen copy of an upload
+PREVIEW_SIDE = 1024
+
+IMAGE_MODE = "📷 Single Image"
+VIDEO_MODE = "🎥 Video Walk-through"
+HISTORY_MODE = "🗂️ History"
+
+# Past images in the history grid
+HISTORY_LIMIT = 24
+
 
 def display_agent_results(results: Dict[str, Any]):
     """Display results from all agents in organized tabs"""
@@ -469,6 +87,15 @@ def display_agent_results(results: Dict[str, Any]):
                 for disease in pathology["diseases_identified"]:
                     st.error(f"🔴 {disease}")
             
+            ensemble = pathology.get("ensemble")
+            if ensemble:
+                verdict = "majority reached" if ensemble["quorum_reached"] else "no majority"
+                st.caption(
+                    f"🗳️ {ensemble['completed']} of {ensemble['requested']} samples completed, "
+                    f"{ensemble['agreement']:.0%} agreement on {ensemble['primary_diagnosis']} ({verdict}); "
+                    f"{ensemble['cancelled']} cancelled early"
+                )
+            
             col1, col2 = st.columns(2)
             with col1:
                 if "pathogen_type" in pathology:
@@ -648,7 +275,22 @@ def display_agent_results(results: Dict[str, Any]):
             st.warning(f"⚠️ Plant has {total_issues} issues that need attention")
         else:
             st.error(f"🚨 Plant has {total_issues} serious issues requiring immediate intervention")
-        
+
+        # Prompt cache usage per agent
+        usage = results.get("usage", {})
+        if usage:
+            with st.expander("🧾 Token Usage & Prompt Caching"):
+                st.table([
+                    {
+                        "Agent": agent_key,
+                        "Calls": 0 if stats.get("reused") else stats.get("calls", 1),
+                        "Prompt Tokens": stats["prompt_tokens"],
+                        "Cached Tokens": stats["cached_tokens"],
+                        "Cached Ratio": f"{stats['cached_ratio']:.0%}",
+                    }
+                    for agent_key, stats in usage.items()
+                ])
+
         # Generate downloadable report
         if st.button("📄 Generate Detailed Report"):
             report_data = {
@@ -668,6 +310,222 @@ def display_agent_results(results: Dict[str, Any]):
                 mime="application/json"
             )
 
+@st.cache_resource(show_spinner=False)
+def get_router(api_key: str, backends_config: str, cassette_mode: str, cassette_dir: str) -> BackendRouter:
+    """Build the backend router once per configuration and reuse its clients across reruns"""
+    http_client = None
+    async_http_client_factory = None
+    if cassette_mode != "off":
+        from replay import make_async_http_client, make_http_client
+        http_client = make_http_client(cassette_mode, cassette_dir)
+        async_http_client_factory = partial(make_async_http_client, cassette_mode, cassette_dir)
+    return BackendRouter.from_config(load_backend_config(backends_config), api_key=api_key, http_client=http_client,
+                                     async_http_client_factory=async_http_client_factory,
+                                     replay=cassette_mode == "replay")
+
+
+@st.cache_resource(show_spinner=False)
+def get_blob_store(root: str):
+    """Content-addressed store of analyzed images, thumbnails and results"""
+    from blobstore import BlobStore
+    return BlobStore(root)
+
+
+def create_agent_manager(router: BackendRouter):
+    """Create the agent manager, importing the agent stack on first use"""
+    from agents import TomatoAnalysisAgent
+    return TomatoAnalysisAgent(router=router)
+
+
+def prepare_upload(uploaded_file, crop_to_leaf: bool, lesion_tiles: int):
+    """Decode an upload with bounded memory and build its agent payload.
+    
+    The result is kept in session state per file and options, so reruns do not
+    decode again. The decoded frame is closed as soon as the payload and a
+    small preview exist; only those stay in the session.
+    """
+    cache_key = (uploaded_file.file_id, crop_to_leaf, lesion_tiles)
+    cached = st.session_state.get("prepared_upload")
+    if cached is not None and cached[0] == cache_key:
+        return cached[1]
+    
+    # Drop the previous upload before decoding the next one
+    st.session_state.pop("prepared_upload", None)
+    from preprocess import PreparedImage, load_upload, prepare_leaf_image
+    
+    uploaded_file.seek(0)
+    image, info = load_upload(uploaded_file)
+    try:
+        if crop_to_leaf:
+            prepared = prepare_leaf_image(image, tiles=lesion_tiles)
+        else:
+            prepared = PreparedImage.from_image(image)
+        prepared.payload()
+        preview = image.copy()
+        preview.thumbnail((PREVIEW_SIDE, PREVIEW_SIDE))
+    finally:
+        image.close()
+    
+    st.session_state["prepared_upload"] = (cache_key, (preview, info, prepared))
+    return preview, info, prepared
+
+
+def video_walkthrough(router: BackendRouter):
+    """Analyze the best distinct keyframes of a row walk-through video"""
+    from video import VIDEO_TYPES, analyze_keyframes, format_timestamp, iter_frames, select_keyframes
+    
+    st.header("🎥 Upload Row Walk-through Video")
+    video_file = st.file_uploader(
+        "Choose a video filmed while walking the row...",
+        type=VIDEO_TYPES,
+        help="Film slowly and close to the foliage; the sharpest distinct leaf frames are analyzed"
+    )
+    if video_file is None:
+        return
+    
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        st.video(video_file)
+    
+    with col2:
+        st.subheader("🎞️ Keyframe Selection")
+        top_k = st.slider("Keyframes to analyze", min_value=1, max_value=12, value=5)
+        sample_fps = st.slider("Frames sampled per second", min_value=0.5, max_value=5.0, value=2.0, step=0.5)
+        max_workers = st.slider(
+            "Parallel analyses", min_value=1, max_value=4, value=2,
+            help="Keyframes analyzed at the same time; each runs all five agents"
+        )
+        keyframes_only = st.checkbox(
+            "⚡ Fast scan (decoder keyframes only)", value=False,
+            help="Much faster on long clips, but only sees one frame every few seconds"
+        )
+        
+        if st.button("🔍 Analyze Walk-through", type="primary", use_container_width=True):
+            try:
+                with st.spinner("🎞️ Scanning video for sharp, distinct leaf frames..."):
+                    video_file.seek(0)
+                    keyframes = select_keyframes(
+                        iter_frames(video_file, sample_fps=sample_fps, keyframes_only=keyframes_only),
+                        top_k=top_k
+                    )
+            except ImportError as e:
+                st.error(f"❌ {str(e)}")
+                return
+            except (OSError, ValueError) as e:
+                st.error(f"❌ Could not decode video: {str(e)}")
+                return
+            
+            if not keyframes:
+                st.warning("⚠️ No sharp frames with visible leaves were found in this video")
+                return
+            
+            progress_bar = st.progress(0)
+            status_text = st.empty()
+            
+            def on_result(done: int, total: int):
+                progress_bar.progress(done / total)
+                status_text.text(f"🤖 Analyzed {done}/{total} keyframes")
+            
+            analyses = analyze_keyframes(router, keyframes, max_workers=max_workers, on_result=on_result)
+            progress_bar.empty()
+            status_text.empty()
+            
+            # Keep thumbnails, not full frames, in the session
+            for analysis, keyframe in zip(analyses, keyframes):
+                thumbnail = keyframe.image.copy()
+                thumbnail.thumbnail((PREVIEW_SIDE // 4, PREVIEW_SIDE // 4))
+                analysis["thumbnail"] = thumbnail
+            st.session_state['video_results'] = (video_file.file_id, analyses)
+    
+    cached = st.session_state.get('video_results')
+    if cached is None or cached[0] != video_file.file_id:
+        return
+    analyses = cached[1]
+    
+    st.markdown("---")
+    st.header("🎞️ Keyframe Results")
+    st.table([
+        {
+            "Time": format_timestamp(analysis["timestamp"]),
+            "Diseases": ", ".join(analysis["results"].get("pathology", {}).get("diseases_identified", [])) or "None",
+            "Severity": analysis["results"].get("pathology", {}).get("severity_score", "-"),
+            "Sharpness": analysis["sharpness"],
+            "Leaf Coverage": f"{analysis['leaf_coverage']:.0%}",
+        }
+        for analysis in analyses
+    ])
+    st.image(
+        [analysis["thumbnail"] for analysis in analyses],
+        caption=[format_timestamp(analysis["timestamp"]) for analysis in analyses]
+    )
+    
+    choice = st.selectbox(
+        "Show full analysis for frame", range(len(analyses)),
+        format_func=lambda i: f"⏱️ {format_timestamp(analyses[i]['timestamp'])}"
+    )
+    display_agent_results(analyses[choice]["results"])
+
+
+def analysis_history(router: BackendRouter, store):
+    """Browse stored analyses and re-run them from the stored payload"""
+    st.header("🗂️ Analysis History")
+    records = store.history(limit=HISTORY_LIMIT)
+    if not records:
+        st.info("No analyses stored yet - analyzed images show up here")
+        return
+    
+    # Thumbnails are precomputed, so the grid never decodes a full image
+    st.image(
+        [store.thumbnail(record["key"], side=128) for record in records],
+        caption=[record["source"].get("name", record["key"][:12]) for record in records]
+    )
+    
+    labels = {
+        record["key"]: f"{record['source'].get('name', record['key'][:12])} - {len(record['analyses'])} analyses"
+        for record in records
+    }
+    key = st.selectbox("Image", list(labels), format_func=labels.get)
+    record = store.get_record(key)
+    
+    results = store.latest_analysis(key)
+    
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        st.image(store.thumbnail(key), caption=f"Stored {record['created'][:19]}")
+    with col2:
+        st.write(f"**Image Key:** `{key[:16]}`")
+        st.write(f"**Leaf Coverage:** {record['leaf_fraction']:.0%}")
+        st.write(f"**Payload Images:** {len(record['payload'])}")
+        
+        # Only agents whose prompt, model or parameters changed are re-run
+        agent_manager = create_agent_manager(router)
+        stale = agent_manager.stale_agents(results) if results else list(AGENT_PROMPTS)
+        if stale:
+            st.warning(f"Out of date: {', '.join(stale)}")
+        else:
+            st.success("All agent results are up to date")
+        force = st.checkbox("Re-run all agents", value=False)
+        if st.button("🔁 Re-run Analysis", type="primary", use_container_width=True, disabled=not (stale or force)):
+            with st.spinner("🤖 Re-running changed agents on the stored payload..."):
+                prepared = store.load_prepared(key)
+                if results:
+                    updated = agent_manager.reanalyze(prepared, results, force=force)
+                else:
+                    updated = agent_manager.run_multi_agent_analysis(prepared)
+            if "error" in updated:
+                st.error(f"❌ Analysis failed: {updated['error']}")
+            else:
+                store.add_analysis(key, updated)
+                results = updated
+                reanalysis = updated.get("reanalysis", {})
+                st.info(f"Recomputed {', '.join(reanalysis.get('recomputed', AGENT_PROMPTS))}; "
+                        f"reused {', '.join(reanalysis.get('reused', [])) or 'nothing'}")
+    
+    if results is not None:
+        st.markdown("---")
+        display_agent_results(results)
+
+
 def main():
     st.title("🍅 Advanced Tomato Plant Disease Detection")
     st.markdown("**Powered by OpenAI and Specialized AI Agents**")
@@ -684,7 +542,21 @@ def main():
     # Get API key from environment variable
     api_key = os.getenv("OPENAI_API_KEY")
     
-    if not api_key:
+    # Record/replay mode (off/record/replay) for offline runs and regression testing
+    cassette_mode = os.getenv("OPENAI_CASSETTE_MODE", "off").lower()
+    cassette_dir = os.getenv("OPENAI_CASSETTE_DIR", "cassettes")
+    if cassette_mode == "replay" and not api_key:
+        api_key = "replay-mode"
+    
+    # Vision backends: every agent uses OpenAI gpt-4o unless VISION_BACKENDS routes it elsewhere
+    try:
+        router = get_router(api_key, os.getenv("VISION_BACKENDS", ""), cassette_mode, cassette_dir)
+    except (OSError, ValueError, TypeError) as e:
+        st.error(f"❌ Invalid VISION_BACKENDS configuration: {str(e)}")
+        return
+    needs_openai_key = any(not b.is_local and not b.api_key for b in router.backends.values())
+    
+    if needs_openai_key and not api_key:
         st.error("❌ OpenAI API key not found!")
         st.warning("""
         **Please set up your OpenAI API key:**
@@ -706,37 +578,102 @@ def main():
         return
     
     # Display API key status (masked for security)
-    st.sidebar.success(f"🔑 API Key Loaded: {'*' * 20}{api_key[-4:]}")
-    
-    # Initialize agent manager
-    agent_manager = TomatoAnalysisAgent(api_key)
+    if api_key:
+        st.sidebar.success(f"🔑 API Key Loaded: {'*' * 20}{api_key[-4:]}")
+    if cassette_mode != "off":
+        st.sidebar.info(f"📼 Cassette mode: {cassette_mode} ({cassette_dir})")
+    
+    with st.sidebar.expander("🖥️ Vision Backends"):
+        for agent_key in AGENT_PROMPTS:
+            backend = router.backend_for(agent_key)
+            st.write(f"**{agent_key}** → {backend.name} (`{backend.model}`)")
+        if st.button("Check Backend Health"):
+            for name, status in router.health_check().items():
+                if not status["ok"]:
+                    st.error(f"{name}: unreachable - {status['error']}")
+                elif not status["model_available"]:
+                    st.warning(f"{name}: up in {status['latency_ms']} ms, but model `{status['model']}` is not listed")
+                else:
+                    st.success(f"{name}: OK in {status['latency_ms']} ms")
     
     # File upload section
-    st.header("📤 Upload Tomato Leaf Image")
-    uploaded_file = st.file_uploader(
-        "Choose a tomato leaf image for comprehensive analysis...",
-        type=['png', 'jpg', 'jpeg', 'webp'],
-        help="Upload a clear, well-lit image of the tomato leaf showing any symptoms"
+    input_mode = st.radio(
+        "Input", [IMAGE_MODE, VIDEO_MODE, HISTORY_MODE], horizontal=True, label_visibility="collapsed"
     )
     
+    if input_mode == VIDEO_MODE:
+        video_walkthrough(router)
+        uploaded_file = None
+    elif input_mode == HISTORY_MODE:
+        analysis_history(router, get_blob_store(os.getenv("BLOB_STORE_DIR", "blobstore")))
+        uploaded_file = None
+    else:
+        st.header("📤 Upload Tomato Leaf Image")
+        uploaded_file = st.file_uploader(
+            "Choose a tomato leaf image for comprehensive analysis...",
+            type=['png', 'jpg', 'jpeg', 'webp'],
+            help="Upload a clear, well-lit image of the tomato leaf showing any symptoms"
+        )
+    
     if uploaded_file is not None:
         # Display uploaded image
         col1, col2 = st.columns([1, 1])
         
+        with col2:
+            st.subheader("🚀 Multi-Agent Analysis")
+            st.write("Click below to start comprehensive analysis using 5 specialized AI agents")
+            
+            # Crop away soil/sky/hands locally so the image tokens go to the leaf
+            crop_to_leaf = st.checkbox(
+                "✂️ Crop to leaf before upload", value=True,
+                help="Segments the leaf locally and sends only its bounding box, so the agents see the "
+                     "leaf in more detail; a typical photo costs about the same image tokens either way"
+            )
+            lesion_tiles = 0
+            if crop_to_leaf:
+                lesion_tiles = st.slider(
+                    "🔎 Zoomed lesion tiles", min_value=0, max_value=4, value=0,
+                    help="Also send close-ups of the most lesion-dense regions"
+                )
+            
+            # Several concurrent pathology samples vote on the diagnosis
+            pathology_samples = st.slider(
+                "🗳️ Pathology second opinions", min_value=1, max_value=7, value=1, step=2,
+                help="Sample the pathology agent several times and keep the majority diagnosis; "
+                     "samples still running are cancelled once a majority agrees"
+            )
+        
+        from preprocess import ImageTooLargeError
+        
+        try:
+            preview, info, prepared = prepare_upload(uploaded_file, crop_to_leaf, lesion_tiles)
+        except ImageTooLargeError as e:
+            st.error(f"❌ Image rejected: {str(e)}")
+            return
+        except (OSError, SyntaxError) as e:
+            st.error(f"❌ Could not read image: {str(e)}")
+            return
+        
         with col1:
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Uploaded Image", use_container_width=True)
+            st.image(preview, caption="Uploaded Image", use_container_width=True)
             
             # Image details
             st.subheader("Image Information")
             st.write(f"**Filename:** {uploaded_file.name}")
-            st.write(f"**Size:** {image.size[0]} x {image.size[1]} pixels")
-            st.write(f"**Format:** {image.format}")
+            st.write(f"**Size:** {info.original_size[0]} x {info.original_size[1]} pixels")
+            st.write(f"**Format:** {info.format}")
             st.write(f"**File Size:** {uploaded_file.size / 1024:.1f} KB")
         
         with col2:
-            st.subheader("🚀 Multi-Agent Analysis")
-            st.write("Click below to start comprehensive analysis using 5 specialized AI agents")
+            with st.expander("🖼️ Prepared Upload"):
+                if prepared.crop_box is None and crop_to_leaf:
+                    st.caption("No clear leaf region found - sending the full frame")
+                st.image(prepared.image, caption=f"Sent to agents ({prepared.leaf_fraction:.0%} leaf coverage)",
+                         use_container_width=True)
+                if prepared.tiles:
+                    st.image(prepared.tiles, width=120)
+                st.write(f"**Decoded At:** {info.decoded_size[0]} x {info.decoded_size[1]} pixels")
+                st.write(f"**Upload Payload:** {prepared.payload_bytes() / 1024:.1f} KB")
             
             if st.button("🔍 Start Multi-Agent Analysis", type="primary", use_container_width=True):
                 
@@ -752,7 +689,8 @@ def main():
                         progress_bar.progress(20)
                         
                         # Run the multi-agent analysis
-                        results = agent_manager.run_multi_agent_analysis(image)
+                        agent_manager = create_agent_manager(router)
+                        results = agent_manager.run_multi_agent_analysis(prepared, pathology_samples=pathology_samples)
                         
                         progress_bar.progress(100)
                         status_text.text("✅ Analysis complete!")
@@ -760,6 +698,16 @@ def main():
                         # Store results in session state
                         st.session_state['analysis_results'] = results
                         
+                        # Keep the payload, thumbnails and results for the history view
+                        if "error" not in results:
+                            store = get_blob_store(os.getenv("BLOB_STORE_DIR", "blobstore"))
+                            key = store.put_image(prepared, source={
+                                "name": uploaded_file.name,
+                                "format": info.format,
+                                "size": list(info.original_size),
+                            })
+                            store.add_analysis(key, results)
+                        
                     except Exception as e:
                         st.error(f"❌ Analysis failed: {str(e)}")
                         st.write("Please check your API key and try again.")
@@ -768,6 +716,28 @@ def main():
                 # Clear progress indicators
                 progress_bar.empty()
                 status_text.empty()
+            
+            # Side-by-side latency and agreement check between two backends
+            if len(router.backends) > 1:
+                with st.expander("⚖️ Compare Backends"):
+                    names = list(router.backends)
+                    primary = st.selectbox("Primary backend", names, index=names.index(router.default))
+                    candidate = st.selectbox("Candidate backend", [name for name in names if name != primary])
+                    if st.button("Run Comparison", use_container_width=True):
+                        from compare import compare_backends
+                        
+                        with st.spinner(f"Comparing {primary} and {candidate}..."):
+                            report = compare_backends(router, prepared, primary, candidate)
+                        st.table([
+                            {
+                                "Agent": agent_key,
+                                f"{primary} (ms)": entry["primary_latency_ms"],
+                                f"{candidate} (ms)": entry["candidate_latency_ms"],
+                                "Findings Agreement": entry.get("findings_jaccard", "error"),
+                                "Categorical Match": entry.get("categorical_match", "-"),
+                            }
+                            for agent_key, entry in report.items()
+                        ])
         
         # Display results if available
         if 'analysis_results' in st.session_state:
@@ -777,105 +747,20 @@ def main():
     # Sidebar information (removed configuration section)
     st.sidebar.header("🧠 AI Agent Capabilities")
     
-    with st.sidebar.expander("🦠 Plant Pathology Agent"):
-        st.markdown("""
-        **Detects 30+ diseases:**
-        - **Fungal**: Early Blight, Late Blight, Septoria, Target Spot, Anthracnose, Powdery Mildew, Fusarium Wilt, etc.
-        - **Bacterial**: Bacterial Spot, Bacterial Speck, Bacterial Wilt, Bacterial Canker
-        - **Viral**: TMV, ToMV, TSWV, CMV, TYLCV, TBSV
-        """)
-    
-    with st.sidebar.expander("🐛 Entomology Agent"):
-        st.markdown("""
-        **Identifies pest damage:**
-        - **Insects**: Hornworms, Aphids, Whiteflies, Thrips, Spider Mites, Flea Beetles
-        - **Damage Patterns**: Feeding holes, stippling, tunnels, distortion
-        - **Beneficial Insects**: Natural predators and biological control
-        """)
-    
-    with st.sidebar.expander("🌱 Nutrition Agent"):
-        st.markdown("""
-        **Diagnoses deficiencies:**
-        - **Macronutrients**: N, P, K, Ca, Mg, S
-        - **Micronutrients**: Fe, Mn, Zn, B, Cu, Mo
-        - **Disorders**: Blossom end rot, catfacing, cracking, sunscald
-        """)
-    
-    with st.sidebar.expander("🌤️ Environmental Agent"):
-        st.markdown("""
-        **Analyzes stress factors:**
-        - **Abiotic Stress**: Heat, cold, water, light, wind, chemicals
-        - **Growing Conditions**: Humidity, air circulation, soil health
-        - **Management**: Irrigation, climate control recommendations
-        """)
-    
-    with st.sidebar.expander("💊 Treatment Coordinator"):
-        st.markdown("""
-        **Integrated management:**
-        - **Treatment Priority**: Immediate vs. long-term actions
-        - **Organic Solutions**: Natural and biological controls
-        - **Chemical Options**: Conventional treatments when needed
-        - **Prevention**: Cultural practices and resistance management
-        """)
+    for title, capabilities in AGENT_CAPABILITIES:
+        with st.sidebar.expander(title):
+            st.markdown(capabilities)
     
     st.sidebar.markdown("---")
     st.sidebar.header("📸 Image Guidelines")
-    st.sidebar.markdown("""
-    **For best results:**
-    - 🔆 Good lighting (natural light preferred)
-    - 🎯 Sharp focus on symptoms
-    - 📏 Close-up of affected areas
-    - 🍃 Include both healthy and affected tissue
-    - 📱 High resolution (>1MP recommended)
-    
-    **Avoid:**
-    - ❌ Blurry or dark images
-    - ❌ Images with heavy shadows
-    - ❌ Too far from subject
-    - ❌ Low resolution photos
-    """)
+    st.sidebar.markdown(IMAGE_GUIDELINES)
     
     st.sidebar.markdown("---")
     st.sidebar.header("🔬 Disease Database")
     
     # Expandable disease reference
     with st.sidebar.expander("📚 Common Tomato Diseases"):
-        disease_data = {
-            "Fungal Diseases": [
-                "Early Blight (Alternaria solani)",
-                "Late Blight (Phytophthora infestans)", 
-                "Septoria Leaf Spot",
-                "Target Spot (Corynespora cassiicola)",
-                "Anthracnose",
-                "Powdery Mildew",
-                "Downy Mildew",
-                "Fusarium Wilt",
-                "Verticillium Wilt",
-                "Black Mold",
-                "Gray Mold (Botrytis)",
-                "Leaf Mold (Passalora fulva)"
-            ],
-            "Bacterial Diseases": [
-                "Bacterial Spot (Xanthomonas)",
-                "Bacterial Speck (Pseudomonas)",
-                "Bacterial Wilt (Ralstonia)",
-                "Bacterial Canker (Clavibacter)",
-                "Pith Necrosis"
-            ],
-            "Viral Diseases": [
-                "Tomato Mosaic Virus (ToMV)",
-                "Tobacco Mosaic Virus (TMV)",
-                "Tomato Spotted Wilt Virus",
-                "Cucumber Mosaic Virus",
-                "Tomato Yellow Leaf Curl Virus",
-                "Tomato Bushy Stunt Virus"
-            ]
-        }
-        
-        for category, diseases in disease_data.items():
-            st.markdown(f"**{category}:**")
-            for disease in diseases:
-                st.markdown(f"• {disease}")
+        st.markdown(DISEASE_REFERENCE)
     
     # Footer
     st.markdown("---")
@@ -0,0 +1,209 @@
+"""Vision backend configuration and per-agent routing.
+
+A backend is any server that speaks the OpenAI chat-completions protocol:
+the OpenAI API itself, or a local llama.cpp / vLLM / Ollama server hosting a
+vision model. Each agent can be routed to a different backend, e.g. to run
+high-volume triage agents on-prem and keep the treatment coordinator on gpt-4o.
+
+Configuration comes from the ``VISION_BACKENDS`` environment variable, either
+inline JSON or a path to a JSON file:
+
+    {
+        "backends": {
+            "openai": {"model": "gpt-4o"},
+            "local": {"base_url": "http://localhost:11434/v1", "model": "llava:13b"}
+        },
+        "agents": {"entomology": "local", "nutrition": "local", "environmental": "local"},
+        "default": "openai"
+    }
+
+Agents without an entry use the default backend.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Callable, Dict, Any, Optional
+
+if TYPE_CHECKING:
+    # The openai SDK takes ~0.4 s to import; it is loaded when the first client is built
+    import httpx
+    import openai
+
+DEFAULT_MODEL = "gpt-4o"
+DEFAULT_BACKEND = "openai"
+
+
+@dataclass(frozen=True)
+class VisionBackend:
+    """An OpenAI-compatible endpoint plus the model to use on it"""
+    name: str
+    model: str = DEFAULT_MODEL
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    timeout: float = 120.0
+    max_retries: int = 2
+
+    @property
+    def is_local(self) -> bool:
+        return not self.is_openai
+
+    @property
+    def effective_base_url(self) -> Optional[str]:
+        """The URL the client will call: base_url, else $OPENAI_BASE_URL (which the SDK honours)"""
+        return self.base_url or os.getenv("OPENAI_BASE_URL") or None
+
+    @property
+    def is_openai(self) -> bool:
+        url = self.effective_base_url
+        return url is None or "api.openai.com" in url
+
+    def resolved_api_key(self) -> str:
+        """Explicit key, else $OPENAI_API_KEY for the OpenAI API only; never leak it to other hosts"""
+        if self.api_key:
+            return self.api_key
+        if self.is_openai and os.getenv("OPENAI_API_KEY"):
+            return os.environ["OPENAI_API_KEY"]
+        # Local servers ignore the key, but the client refuses to start without one
+        return "not-needed"
+
+    def create_client(self, http_client: Optional["httpx.Client"] = None) -> "openai.OpenAI":
+        import openai
+
+        return openai.OpenAI(
+            api_key=self.resolved_api_key(),
+            base_url=self.effective_base_url,
+            timeout=self.timeout,
+            max_retries=self.max_retries,
+            http_client=http_client,
+        )
+
+    def create_async_client(self, http_client: Optional["httpx.AsyncClient"] = None) -> "openai.AsyncOpenAI":
+        import openai
+
+        return openai.AsyncOpenAI(
+            api_key=self.resolved_api_key(),
+            base_url=self.effective_base_url,
+            timeout=self.timeout,
+            max_retries=self.max_retries,
+            http_client=http_client,
+        )
+
+
+AsyncHttpClientFactory = Callable[[], Optional["httpx.AsyncClient"]]
+
+
+class BackendRouter:
+    """Maps agent keys to backends and caches one client per backend"""
+
+    def __init__(self, backends: Dict[str, VisionBackend], agents: Optional[Dict[str, str]] = None,
+                 default: str = DEFAULT_BACKEND, http_client: Optional["httpx.Client"] = None,
+                 async_http_client_factory: Optional[AsyncHttpClientFactory] = None, replay: bool = False):
+        if default not in backends:
+            raise ValueError(f"Default backend '{default}' is not configured")
+        unknown = {name for name in (agents or {}).values() if name not in backends}
+        if unknown:
+            raise ValueError(f"Agents routed to unknown backends: {sorted(unknown)}")
+        self.backends = backends
+        self.agents = dict(agents or {})
+        self.default = default
+        self.http_client = http_client
+        # Async clients are bound to the event loop they first run on, so a
+        # fresh one (and its http client) is built per loop instead of cached
+        self.async_http_client_factory = async_http_client_factory
+        # Responses come from recorded cassettes, not live backends
+        self.replay = replay
+        self._clients: Dict[str, "openai.OpenAI"] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def single(cls, api_key: Optional[str] = None, base_url: Optional[str] = None,
+               model: str = DEFAULT_MODEL, http_client: Optional["httpx.Client"] = None,
+               async_http_client_factory: Optional[AsyncHttpClientFactory] = None,
+               replay: bool = False) -> "BackendRouter":
+        """Router that sends every agent to one backend"""
+        backend = VisionBackend(DEFAULT_BACKEND, model=model, base_url=base_url, api_key=api_key)
+        return cls({DEFAULT_BACKEND: backend}, http_client=http_client,
+                   async_http_client_factory=async_http_client_factory, replay=replay)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], api_key: Optional[str] = None,
+                    http_client: Optional["httpx.Client"] = None,
+                    async_http_client_factory: Optional[AsyncHttpClientFactory] = None,
+                    replay: bool = False) -> "BackendRouter":
+        backends = {}
+        for name, spec in config.get("backends", {}).items():
+            backends[name] = VisionBackend(name=name, **spec)
+        if not backends:
+            backends[DEFAULT_BACKEND] = VisionBackend(DEFAULT_BACKEND)
+        # `api_key` is an OpenAI key: only backends that really call OpenAI get it
+        if api_key:
+            backends = {
+                name: replace(backend, api_key=api_key) if backend.is_openai and not backend.api_key else backend
+                for name, backend in backends.items()
+            }
+        default = config.get("default", DEFAULT_BACKEND if DEFAULT_BACKEND in backends else next(iter(backends)))
+        return cls(backends, config.get("agents", {}), default=default, http_client=http_client,
+                   async_http_client_factory=async_http_client_factory, replay=replay)
+
+    def backend_for(self, agent_key: str) -> VisionBackend:
+        return self.backends[self.agents.get(agent_key, self.default)]
+
+    def client(self, backend: VisionBackend) -> "openai.OpenAI":
+        with self._lock:
+            client = self._clients.get(backend.name)
+            if client is None:
+                client = backend.create_client(self.http_client)
+                self._clients[backend.name] = client
+            return client
+
+    def create_async_client(self, backend: VisionBackend) -> "openai.AsyncOpenAI":
+        """New async client for `backend`; the caller closes it before its event loop ends"""
+        http_client = self.async_http_client_factory() if self.async_http_client_factory else None
+        return backend.create_async_client(http_client)
+
+    def with_backend(self, name: str) -> "BackendRouter":
+        """Copy of this router that sends every agent to one named backend"""
+        return BackendRouter(self.backends, {}, default=name, http_client=self.http_client,
+                             async_http_client_factory=self.async_http_client_factory, replay=self.replay)
+
+    def health_check(self) -> Dict[str, Dict[str, Any]]:
+        """Check every configured backend; see check_backend"""
+        return {name: check_backend(backend, self.client(backend)) for name, backend in self.backends.items()}
+
+
+def check_backend(backend: VisionBackend, client: Optional["openai.OpenAI"] = None) -> Dict[str, Any]:
+    """Probe a backend's /models endpoint and report reachability, latency and model availability"""
+    client = client or backend.create_client()
+    status = {
+        "backend": backend.name,
+        "base_url": backend.effective_base_url or "https://api.openai.com/v1",
+        "model": backend.model,
+        "ok": False,
+        "model_available": False,
+        "latency_ms": None,
+        "error": None,
+    }
+    start = time.perf_counter()
+    try:
+        models = client.with_options(timeout=10, max_retries=0).models.list()
+        status["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        status["ok"] = True
+        status["model_available"] = any(model.id == backend.model for model in models.data)
+    except Exception as e:
+        status["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        status["error"] = str(e)
+    return status
+
+
+def load_backend_config(value: Optional[str] = None) -> Dict[str, Any]:
+    """Read backend config from inline JSON or a JSON file path (defaults to $VISION_BACKENDS)"""
+    value = value if value is not None else os.getenv("VISION_BACKENDS", "")
+    value = value.strip()
+    if not value:
+        return {}
+    if value.startswith("{"):
+        return json.loads(value)
+    with open(value, "r", encoding="utf-8") as f:
+        return json.load(f)
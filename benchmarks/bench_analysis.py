@@ -0,0 +1,93 @@
+"""Throughput and latency benchmark for run_multi_agent_analysis.
+
+Runs against the local stub server by default, so no API key or network is
+needed. Point it at recorded cassettes or any OpenAI-compatible endpoint with
+--cassettes / --base-url.
+
+    python -m benchmarks.bench_analysis --latency-ms 200 --jitter-ms 50
+    python -m benchmarks.bench_analysis --cassettes cassettes --iterations 5
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from PIL import Image
+
+from agents import TomatoAnalysisAgent
+from benchmarks.common import format_stats, latency_stats, synthetic_leaf
+from replay import make_http_client
+from stub_server import StubConfig, start_stub_server
+
+
+def _timed_analysis(make_agent: Callable[[], TomatoAnalysisAgent], image: Image.Image) -> float:
+    agent = make_agent()
+    start = time.perf_counter()
+    results = agent.run_multi_agent_analysis(image)
+    elapsed = time.perf_counter() - start
+    if "error" in results:
+        raise RuntimeError(results["error"])
+    return elapsed
+
+
+def bench_single(make_agent, image: Image.Image, iterations: int):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        latencies.append(_timed_analysis(make_agent, image))
+    return latency_stats(latencies, time.perf_counter() - start)
+
+
+def bench_concurrent(make_agent, image: Image.Image, iterations: int, workers: int):
+    """Many sessions analysing the same upload at once"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(lambda _: _timed_analysis(make_agent, image), range(iterations)))
+    return latency_stats(latencies, time.perf_counter() - start)
+
+
+def bench_batch(make_agent, images: List[Image.Image], workers: int):
+    """A batch of distinct images submitted together"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(lambda img: _timed_analysis(make_agent, img), images))
+    return latency_stats(latencies, time.perf_counter() - start)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Stub server mean latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Stub server latency jitter")
+    parser.add_argument("--base-url", default=None, help="Use this endpoint instead of the built-in stub")
+    parser.add_argument("--cassettes", default=None, help="Replay from this cassette directory")
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.base_url
+    http_client = None
+    if args.cassettes:
+        http_client = make_http_client("replay", args.cassettes)
+    elif base_url is None:
+        server, base_url = start_stub_server(config=StubConfig(args.latency_ms, args.jitter_ms, seed=0))
+
+    def make_agent() -> TomatoAnalysisAgent:
+        return TomatoAnalysisAgent(api_key="benchmark", base_url=base_url, http_client=http_client)
+
+    image = synthetic_leaf()
+    try:
+        print(format_stats("single", bench_single(make_agent, image, args.iterations)))
+        print(format_stats("concurrent", bench_concurrent(make_agent, image, args.iterations, args.workers)))
+        # Cassettes are keyed by request body, so a replayed batch must reuse the recorded image
+        batch = [image if args.cassettes else synthetic_leaf(seed=i) for i in range(args.batch_size)]
+        print(format_stats("batch", bench_batch(make_agent, batch, args.workers)))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
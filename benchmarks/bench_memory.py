@@ -0,0 +1,124 @@
+"""Per-session memory benchmark for decoding large uploads.
+
+Each scenario runs in a fresh subprocess and reports its peak RSS increase
+(Pillow's pixel buffers live outside the Python allocator, so tracemalloc
+would miss them) and the bytes still held afterwards, i.e. what a session
+keeps alive between reruns.
+
+    python -m benchmarks.bench_memory
+    python -m benchmarks.bench_memory drone.png camera.jpg
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+SCENARIOS = ("naive", "bounded")
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss survives fork+exec on Linux, so a child would report the
+    # parent's high-water mark; VmHWM is reset for each new process image
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _image_bytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+def run_scenario(scenario: str, path: str) -> Dict[str, float]:
+    """Decode and prepare one upload the old way or the bounded way"""
+    from preprocess import PreparedImage, load_upload, prepare_leaf_image
+
+    with open(path, "rb") as f:
+        data = f.read()
+    baseline = _peak_rss_bytes()
+
+    if scenario == "naive":
+        # What main() used to do: keep the fully decoded image for the session
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        prepared = PreparedImage.from_image(image)
+        prepared.payload()
+        retained = _image_bytes(image) + _image_bytes(prepared.image)
+    else:
+        image, _ = load_upload(io.BytesIO(data))
+        prepared = prepare_leaf_image(image)
+        prepared.payload()
+        preview = image.copy()
+        preview.thumbnail((1024, 1024))
+        image.close()
+        retained = _image_bytes(preview) + _image_bytes(prepared.image)
+
+    retained += prepared.payload_bytes()
+    return {
+        "peak_mb": (_peak_rss_bytes() - baseline) / 1e6,
+        "retained_mb": retained / 1e6,
+    }
+
+
+def _make_synthetic(directory: str) -> List[str]:
+    from benchmarks.common import synthetic_leaf
+    from preprocess import ORIENTATION_TAG
+
+    paths = []
+    # Portrait phone photos are stored landscape with an EXIF rotation (6 = 90 degrees clockwise)
+    for name, size, fmt, orientation in (
+        ("camera_48mp.jpg", (8000, 6000), "JPEG", None),
+        ("portrait_48mp_exif6.jpg", (8000, 6000), "JPEG", 6),
+        ("drone_24mp.png", (6000, 4000), "PNG", None),
+    ):
+        path = os.path.join(directory, name)
+        image = synthetic_leaf(*size)
+        if orientation is None:
+            image.save(path, fmt)
+        else:
+            exif = Image.Exif()
+            exif[ORIENTATION_TAG] = orientation
+            image.save(path, fmt, exif=exif)
+        paths.append(path)
+    return paths
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files (defaults to synthetic 48 MP JPEGs, one EXIF-rotated, and a 24 MP PNG)")
+    parser.add_argument("--scenario", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args.scenario, args.images[0])))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = args.images or _make_synthetic(tmp)
+        print(f"{'image':<28} {'scenario':<8} {'peak MB':>9} {'retained MB':>12}")
+        for path in paths:
+            for scenario in SCENARIOS:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_memory", path, "--scenario", scenario],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                stats = json.loads(output.strip().splitlines()[-1])
+                print(f"{os.path.basename(path)[:28]:<28} {scenario:<8} "
+                      f"{stats['peak_mb']:9.1f} {stats['retained_mb']:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
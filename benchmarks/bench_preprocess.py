@@ -0,0 +1,97 @@
+"""Payload size and per-call latency with and without leaf cropping.
+
+Uses the local stub server by default; pass --base-url (and OPENAI_API_KEY)
+to measure against a real backend, where upload size and image tokens drive
+latency. Image paths may be given; otherwise synthetic field photos are used.
+
+    python -m benchmarks.bench_preprocess --tiles 2
+    python -m benchmarks.bench_preprocess photos/*.jpg --base-url https://api.openai.com/v1
+"""
+import argparse
+import math
+import time
+from typing import List, Optional
+
+from PIL import Image
+
+from agents import TomatoAnalysisAgent
+from benchmarks.common import percentile, synthetic_leaf
+from preprocess import PreparedImage, prepare_leaf_image
+from stub_server import StubConfig, start_stub_server
+
+
+def high_detail_tokens(width: int, height: int) -> int:
+    """OpenAI's published image-token estimate for detail=high"""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def payload_tokens(prepared: PreparedImage) -> int:
+    return sum(high_detail_tokens(*img.size) for img in [prepared.image, *prepared.tiles])
+
+
+def measure(agent: TomatoAnalysisAgent, prepared: PreparedImage, calls: int) -> List[float]:
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        result = agent.pathology_agent(prepared)
+        latencies.append(time.perf_counter() - start)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+    return latencies
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files (defaults to synthetic photos)")
+    parser.add_argument("--tiles", type=int, default=0, help="Zoomed lesion tiles to add")
+    parser.add_argument("--calls", type=int, default=5, help="Agent calls per image and mode")
+    parser.add_argument("--base-url", default=None, help="Measure against this endpoint instead of the stub")
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, base_url = start_stub_server(config=StubConfig(seed=0))
+    agent = TomatoAnalysisAgent(base_url=base_url)
+
+    if args.images:
+        images = [(path, Image.open(path)) for path in args.images]
+    else:
+        images = [(f"synthetic {w}x{h}", synthetic_leaf(w, h, seed=i))
+                  for i, (w, h) in enumerate([(1600, 1200), (4000, 3000)])]
+
+    # Warm up the connection pool so the first measurement is not an outlier
+    measure(agent, PreparedImage.from_image(images[0][1]), 1)
+
+    print(f"{'image':<24} {'mode':<8} {'prep ms':>8} {'payload KB':>11} {'~tokens':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    try:
+        for name, image in images:
+            start = time.perf_counter()
+            full = PreparedImage.from_image(image)
+            full.payload()
+            full_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            cropped = prepare_leaf_image(image, tiles=args.tiles)
+            cropped.payload()
+            crop_ms = (time.perf_counter() - start) * 1000
+
+            for mode, prepared, prep_ms in (("full", full, full_ms), ("cropped", cropped, crop_ms)):
+                latencies = measure(agent, prepared, args.calls)
+                print(
+                    f"{name[:24]:<24} {mode:<8} {prep_ms:8.1f} {prepared.payload_bytes() / 1024:11.1f} "
+                    f"{payload_tokens(prepared):8d} {percentile(latencies, 50) * 1000:8.1f} "
+                    f"{percentile(latencies, 95) * 1000:8.1f}"
+                )
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
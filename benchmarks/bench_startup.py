@@ -0,0 +1,153 @@
+"""Cold-start benchmark for app.py with a regression budget.
+
+Each measurement imports the app in a fresh interpreter with ``-X importtime``
+and reports how much the app adds on top of a bare ``import streamlit``
+(Streamlit itself is outside our control). It then renders the first page
+once with Streamlit's AppTest, as a browser session would, and times it. It
+fails if any module that is supposed to load lazily shows up at import time
+or during that first run.
+
+    python -m benchmarks.bench_startup               # check against the budget
+    python -m benchmarks.bench_startup --profile 15  # top direct imports of app.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, Any, List, Optional, Tuple
+
+# Milliseconds app.py may add to a bare `import streamlit` on a cold start.
+# About 150 ms of this is Streamlit work triggered by set_page_config (the
+# emoji table for page_icon); eager openai or pandas imports blow it easily.
+STARTUP_BUDGET_MS = 500.0
+# Milliseconds for the first script run of the default page, app import included
+FIRST_RUN_BUDGET_MS = 1000.0
+
+# Modules that must only be imported on first use
+LAZY_MODULES = (
+    "pandas", "openai", "numpy", "PIL.Image", "httpx", "av", "sqlite3",
+    "agents", "preprocess", "video", "compare", "replay", "blobstore",
+)
+
+# Renders app.py once in a fresh interpreter; prints the time, lazy modules loaded and exceptions
+FIRST_RUN = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(%r, default_timeout=60)
+start = time.perf_counter()
+app.run()
+print(json.dumps({
+    "ms": (time.perf_counter() - start) * 1000,
+    "loaded": sorted(m for m in %r if m in sys.modules),
+    "exceptions": [e.value for e in app.exception],
+}))
+"""
+
+
+def _import_times(statement: str) -> List[Tuple[int, int, str]]:
+    """Run `statement` in a fresh interpreter and parse its -X importtime report"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        check=True, capture_output=True, text=True,
+    ).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:  self [us] | cumulative | <indent>module"
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append((depth, int(cumulative_us), name.strip()))
+    return entries
+
+
+def _cumulative_ms(statement: str, module: str) -> float:
+    for depth, cumulative_us, name in _import_times(statement):
+        if depth == 0 and name == module:
+            return cumulative_us / 1000
+    raise RuntimeError(f"{module} not found in import profile")
+
+
+def loaded_lazy_modules() -> List[str]:
+    statement = "import json, sys, app; print(json.dumps(sorted(m for m in %r if m in sys.modules)))"
+    output = subprocess.run(
+        [sys.executable, "-c", statement % (LAZY_MODULES,)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def first_run() -> Dict[str, Any]:
+    """Render the default page once, with an API key so main() gets past the key check"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "OPENAI_API_KEY": "sk-startup-benchmark", "BLOB_STORE_DIR": tmp}
+        for name in ("VISION_BACKENDS", "OPENAI_CASSETTE_MODE"):
+            env.pop(name, None)
+        output = subprocess.run(
+            [sys.executable, "-c", FIRST_RUN % (os.path.abspath("app.py"), LAZY_MODULES)],
+            check=True, capture_output=True, text=True, env=env,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(runs: int) -> Dict[str, float]:
+    streamlit_ms = [_cumulative_ms("import streamlit", "streamlit") for _ in range(runs)]
+    app_ms = [_cumulative_ms("import app", "app") for _ in range(runs)]
+    return {
+        "streamlit_ms": statistics.median(streamlit_ms),
+        "app_ms": statistics.median(app_ms),
+        "overhead_ms": statistics.median(app_ms) - statistics.median(streamlit_ms),
+    }
+
+
+def profile(top: int):
+    """Print the slowest modules imported directly by app.py"""
+    children = [(cumulative_us, name) for depth, cumulative_us, name in _import_times("import app") if depth == 1]
+    for cumulative_us, name in sorted(children, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:9.1f} ms  {name}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--first-run-budget-ms", type=float, default=FIRST_RUN_BUDGET_MS)
+    parser.add_argument("--profile", type=int, metavar="N", default=0, help="Show the N slowest direct imports")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        profile(args.profile)
+        return
+
+    stats = measure(args.runs)
+    eager = loaded_lazy_modules()
+    runs = [first_run() for _ in range(args.runs)]
+    first_run_ms = statistics.median(run["ms"] for run in runs)
+    print(f"import streamlit: {stats['streamlit_ms']:8.1f} ms (median of {args.runs})")
+    print(f"import app:       {stats['app_ms']:8.1f} ms")
+    print(f"app overhead:     {stats['overhead_ms']:8.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"first run:        {first_run_ms:8.1f} ms (budget {args.first_run_budget_ms:.0f} ms)")
+
+    failures = []
+    if stats["overhead_ms"] > args.budget_ms:
+        failures.append(f"startup overhead {stats['overhead_ms']:.1f} ms exceeds {args.budget_ms:.0f} ms budget")
+    if first_run_ms > args.first_run_budget_ms:
+        failures.append(f"first run {first_run_ms:.1f} ms exceeds {args.first_run_budget_ms:.0f} ms budget")
+    if eager:
+        failures.append(f"modules imported at startup instead of lazily: {', '.join(eager)}")
+    eager_first_run = sorted({m for run in runs for m in run["loaded"]})
+    if eager_first_run:
+        failures.append(f"modules loaded by the first run instead of lazily: {', '.join(eager_first_run)}")
+    exceptions = [e for run in runs for e in run["exceptions"]]
+    if exceptions:
+        failures.append(f"first run raised: {exceptions[0]}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
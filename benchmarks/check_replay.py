@@ -0,0 +1,93 @@
+"""Record/replay regression check, including the pathology ensemble.
+
+Records a full analysis against the stub server (with latency jitter, so
+samples finish out of order), then replays it from the cassettes with the
+network unreachable and fails if the replayed results differ from the
+recorded ones in anything but the timestamp.
+
+    python -m benchmarks.check_replay
+    python -m benchmarks.check_replay --pathology-samples 5
+"""
+import argparse
+import json
+import sys
+import tempfile
+from typing import Dict, Any, List, Optional
+
+from agents import TomatoAnalysisAgent
+from backends import BackendRouter
+from benchmarks.common import synthetic_leaf
+from preprocess import prepare_leaf_image
+from replay import make_async_http_client, make_http_client
+from stub_server import StubConfig, start_stub_server
+
+# Nothing listens here; any request that misses the cassettes fails fast
+UNREACHABLE_URL = "http://127.0.0.1:9/v1"
+
+
+def _router(mode: str, cassette_dir: str, base_url: str) -> BackendRouter:
+    return BackendRouter.single(
+        "replay-check", base_url, model="stub",
+        http_client=make_http_client(mode, cassette_dir),
+        async_http_client_factory=lambda: make_async_http_client(mode, cassette_dir),
+        replay=mode == "replay",
+    )
+
+
+def _comparable(results: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in results.items() if key != "analysis_timestamp"}
+
+
+def check(pathology_samples: int, jitter_ms: float) -> List[str]:
+    prepared = prepare_leaf_image(synthetic_leaf(), tiles=1)
+    server, base_url = start_stub_server(config=StubConfig(latency_ms=20, jitter_ms=jitter_ms, seed=7))
+
+    with tempfile.TemporaryDirectory() as cassette_dir:
+        try:
+            recorded = TomatoAnalysisAgent(router=_router("record", cassette_dir, base_url)).run_multi_agent_analysis(
+                prepared, pathology_samples=pathology_samples)
+        finally:
+            server.shutdown()
+        replayed = TomatoAnalysisAgent(router=_router("replay", cassette_dir, UNREACHABLE_URL)).run_multi_agent_analysis(
+            prepared, pathology_samples=pathology_samples)
+
+    failures = []
+    for label, results in (("recorded", recorded), ("replayed", replayed)):
+        errors = [key for key, value in results.items() if isinstance(value, dict) and "error" in value]
+        if "error" in results or errors:
+            failures.append(f"{label} analysis has errors: {results.get('error') or errors}")
+    if _comparable(recorded) != _comparable(replayed):
+        for key in sorted(set(recorded) | set(replayed)):
+            before, after = recorded.get(key), replayed.get(key)
+            if key == "analysis_timestamp" or before == after:
+                continue
+            if isinstance(before, dict) and isinstance(after, dict):
+                for field in sorted(set(before) | set(after)):
+                    if before.get(field) != after.get(field):
+                        failures.append(f"{key}.{field} differs: recorded {json.dumps(before.get(field))} "
+                                        f"vs replayed {json.dumps(after.get(field))}")
+            else:
+                failures.append(f"{key} differs: recorded {json.dumps(before)} vs replayed {json.dumps(after)}")
+    print(f"pathology ensemble: {json.dumps(replayed.get('pathology', {}).get('ensemble'))}")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pathology-samples", type=int, default=5)
+    parser.add_argument("--jitter-ms", type=float, default=80.0)
+    parser.add_argument("--runs", type=int, default=3, help="Record/replay rounds (finish order varies per round)")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for _ in range(args.runs):
+        failures.extend(check(args.pathology_samples, args.jitter_ms))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: replayed analyses match the recordings")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
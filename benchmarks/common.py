@@ -0,0 +1,55 @@
+"""Shared helpers for the benchmark scripts"""
+import math
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_stats(latencies: List[float], wall_time: float) -> Dict[str, float]:
+    """Throughput and p50/p95/p99 latency (ms) for a run"""
+    return {
+        "count": len(latencies),
+        "throughput_per_s": len(latencies) / wall_time if wall_time > 0 else float("nan"),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def format_stats(name: str, stats: Dict[str, float]) -> str:
+    return (
+        f"{name:<12} n={stats['count']:<5} "
+        f"throughput={stats['throughput_per_s']:8.2f}/s  "
+        f"p50={stats['p50_ms']:8.1f}ms  p95={stats['p95_ms']:8.1f}ms  p99={stats['p99_ms']:8.1f}ms"
+    )
+
+
+def synthetic_leaf(width: int = 1600, height: int = 1200, seed: int = 0) -> Image.Image:
+    """Deterministic test photo: a green leaf with brown lesions on a soil background"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[...] = (110, 85, 60)  # soil
+    pixels += rng.integers(0, 20, size=pixels.shape, dtype=np.uint8)
+
+    cx, cy = width * 0.5, height * 0.5
+    leaf = ((xx - cx) / (width * 0.3)) ** 2 + ((yy - cy) / (height * 0.35)) ** 2 <= 1.0
+    pixels[leaf] = (60, 140, 50)
+
+    for _ in range(12):
+        lx = rng.uniform(cx - width * 0.2, cx + width * 0.2)
+        ly = rng.uniform(cy - height * 0.25, cy + height * 0.25)
+        radius = rng.uniform(10, 40)
+        lesion = ((xx - lx) ** 2 + (yy - ly) ** 2 <= radius ** 2) & leaf
+        pixels[lesion] = (120, 80, 30)
+    return Image.fromarray(pixels)
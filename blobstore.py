@@ -0,0 +1,270 @@
+"""Content-addressed store for analyzed images, their thumbnails and results.
+
+Every blob is named by the SHA-256 of its bytes and written once, so storing
+the same image, thumbnail or result twice costs nothing. Blobs are sharded
+two levels deep to keep directories small:
+
+    <root>/objects/ab/cd/abcdef...             immutable blobs
+    <root>/images/ab/cd/abcdef....json         one record per image, written once
+    <root>/images/ab/cd/abcdef....analyses     append-only log of its analyses
+
+An image is keyed by the hash of its whole normalized payload, i.e. the
+ordered JPEGs sent to the agents (main image, then lesion tiles), so the
+same photo prepared with different tiles is a different entry. Its record
+points at the payload blobs and the precomputed thumbnails; each analysis
+result is a JSON blob listed in the image's append-only log, so the app and
+reanalyze.py can add analyses concurrently without a lock.
+
+Blobs are read through read-only memory maps, so re-analysis base64-encodes
+straight from the page cache and the history view never decodes or
+re-encodes an image.
+
+    store = BlobStore("blobstore")
+    key = store.put_image(prepared, source={"name": "leaf.jpg"})
+    store.add_analysis(key, results)
+    prepared = store.load_prepared(key)
+"""
+import base64
+import hashlib
+import io
+import json
+import mmap
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Union
+
+from PIL import Image
+
+from preprocess import PreparedImage
+
+DEFAULT_ROOT = "blobstore"
+# Long sides of the thumbnails kept for the history view
+THUMBNAIL_SIDES = (128, 256)
+THUMBNAIL_QUALITY = 80
+
+
+def blob_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def payload_key(blob_keys: List[str]) -> str:
+    """Image key: hash of the ordered payload blob keys"""
+    return blob_key("\n".join(blob_keys).encode("ascii"))
+
+
+def _jpeg_bytes(image: Image.Image, quality: int) -> bytes:
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue()
+
+
+class BlobStore:
+    """Sharded content-addressed blob store with per-image records"""
+
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = root
+        # Keeps threads from storing the same new image twice; records are
+        # written once and analyses are appended, so nothing else is locked
+        self._lock = threading.Lock()
+        for directory in ("objects", "images", "tmp"):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    def _sharded(self, directory: str, key: str, suffix: str = "") -> str:
+        return os.path.join(self.root, directory, key[:2], key[2:4], key + suffix)
+
+    def _write_atomic(self, path: str, data: bytes):
+        # Readers only ever see complete files
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    # Blobs
+
+    def blob_path(self, key: str) -> str:
+        return self._sharded("objects", key)
+
+    def has_blob(self, key: str) -> bool:
+        return os.path.exists(self.blob_path(key))
+
+    def put_blob(self, data: bytes) -> str:
+        """Store bytes under their hash; existing blobs are not rewritten"""
+        key = blob_key(data)
+        if not self.has_blob(key):
+            self._write_atomic(self.blob_path(key), data)
+        return key
+
+    @contextmanager
+    def open_blob(self, key: str) -> Iterator[Union[mmap.mmap, bytes]]:
+        """Read-only memory map of a blob; valid until the block exits"""
+        with open(self.blob_path(key), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Empty files cannot be mapped
+                yield b""
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+
+    def read_blob(self, key: str) -> bytes:
+        with self.open_blob(key) as mapped:
+            return mapped[:]
+
+    def blob_base64(self, key: str) -> str:
+        """Base64 of a blob, encoded directly from its memory map"""
+        with self.open_blob(key) as mapped:
+            return base64.b64encode(mapped).decode()
+
+    def put_json(self, value: Any) -> str:
+        return self.put_blob(json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+
+    def read_json(self, key: str) -> Any:
+        with self.open_blob(key) as mapped:
+            return json.loads(mapped[:])
+
+    # Image records
+
+    def record_path(self, key: str) -> str:
+        return self._sharded("images", key, ".json")
+
+    def analyses_path(self, key: str) -> str:
+        return self._sharded("images", key, ".analyses")
+
+    def get_record(self, key: str) -> Optional[Dict[str, Any]]:
+        """The image record with its analyses, oldest first"""
+        try:
+            with open(self.record_path(key), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        record["analyses"] = record.get("analyses", []) + self._read_analyses(key)
+        return record
+
+    def _read_analyses(self, key: str) -> List[Dict[str, Any]]:
+        try:
+            with open(self.analyses_path(key), "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return []
+        analyses = []
+        for line in lines:
+            try:
+                analyses.append(json.loads(line))
+            except ValueError:
+                # A line another process is still writing
+                continue
+        return analyses
+
+    def _save_record(self, record: Dict[str, Any]):
+        self._write_atomic(self.record_path(record["key"]), json.dumps(record, indent=2).encode("utf-8"))
+
+    def put_image(self, prepared: PreparedImage, source: Optional[Dict[str, Any]] = None) -> str:
+        """Store a prepared image's payload and thumbnails; returns the image key.
+
+        The payload is stored exactly as sent to the agents (decoded from its
+        base64, not re-encoded). Storing an image that is already present
+        only returns its key.
+        """
+        payload = [base64.b64decode(item) for item in prepared.payload()]
+        blob_keys = [blob_key(data) for data in payload]
+        key = payload_key(blob_keys)
+        with self._lock:
+            if self.get_record(key) is not None:
+                return key
+            record = {
+                "key": key,
+                "created": datetime.now().isoformat(),
+                "source": source or {},
+                "payload": [self.put_blob(data) for data in payload],
+                "thumbnails": self._put_thumbnails(prepared, payload[0]),
+                "crop_box": list(prepared.crop_box) if prepared.crop_box else None,
+                "leaf_fraction": prepared.leaf_fraction,
+            }
+            self._save_record(record)
+        return key
+
+    def _put_thumbnails(self, prepared: PreparedImage, main_jpeg: bytes) -> Dict[str, str]:
+        image = prepared.image
+        if image is None:
+            image = Image.open(io.BytesIO(main_jpeg))
+            image.draft("RGB", (max(THUMBNAIL_SIDES), max(THUMBNAIL_SIDES)))
+        thumbnails = {}
+        # Largest first, so each thumbnail is shrunk from the previous one
+        thumbnail = image.copy()
+        for side in sorted(THUMBNAIL_SIDES, reverse=True):
+            thumbnail.thumbnail((side, side), Image.LANCZOS)
+            thumbnails[str(side)] = self.put_blob(_jpeg_bytes(thumbnail.convert("RGB"), THUMBNAIL_QUALITY))
+        return thumbnails
+
+    def add_analysis(self, key: str, results: Dict[str, Any]) -> str:
+        """Store an analysis result for an image and append it to the image's history"""
+        if not os.path.exists(self.record_path(key)):
+            raise KeyError(f"No image {key} in the blob store")
+        result_key = self.put_json(results)
+        entry = json.dumps({
+            "result": result_key,
+            "stored": datetime.now().isoformat(),
+            "analysis_timestamp": results.get("analysis_timestamp"),
+        }) + "\n"
+        # One O_APPEND write per entry: concurrent writers in other processes
+        # never overwrite each other's lines
+        fd = os.open(self.analyses_path(key), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, entry.encode("utf-8"))
+        finally:
+            os.close(fd)
+        return result_key
+
+    def latest_analysis(self, key: str) -> Optional[Dict[str, Any]]:
+        record = self.get_record(key)
+        if not record or not record["analyses"]:
+            return None
+        return self.read_json(record["analyses"][-1]["result"])
+
+    def load_prepared(self, key: str) -> PreparedImage:
+        """Rebuild the agent payload of a stored image without decoding or re-encoding it"""
+        record = self.get_record(key)
+        if record is None:
+            raise KeyError(f"No image {key} in the blob store")
+        return PreparedImage.from_payload(
+            [self.blob_base64(blob) for blob in record["payload"]],
+            crop_box=tuple(record["crop_box"]) if record["crop_box"] else None,
+            leaf_fraction=record["leaf_fraction"],
+        )
+
+    def thumbnail(self, key: str, side: int = max(THUMBNAIL_SIDES)) -> bytes:
+        """JPEG bytes of the stored thumbnail closest to `side`"""
+        record = self.get_record(key)
+        if record is None:
+            raise KeyError(f"No image {key} in the blob store")
+        sides = sorted(int(s) for s in record["thumbnails"])
+        best = next((s for s in sides if s >= side), sides[-1])
+        return self.read_blob(record["thumbnails"][str(best)])
+
+    def history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Image records, most recently analyzed (or stored) first.
+
+        Ordering uses file modification times (an image's analysis log is
+        touched on every append), so only the returned records are parsed.
+        """
+        activity: Dict[str, float] = {}
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "images")):
+            for filename in filenames:
+                key, ext = os.path.splitext(filename)
+                if ext in (".json", ".analyses"):
+                    mtime = os.stat(os.path.join(dirpath, filename)).st_mtime
+                    activity[key] = max(activity.get(key, 0.0), mtime)
+
+        keys = sorted(activity, key=activity.get, reverse=True)
+        records = (self.get_record(key) for key in (keys[:limit] if limit else keys))
+        return [record for record in records if record is not None]
@@ -0,0 +1,109 @@
+"""Side-by-side backend comparison: latency and agreement per agent.
+
+Runs the image agents on a primary and a candidate backend for the same
+image, times each call, and scores how closely the findings agree. This is
+how a local vision model is vetted before routing triage traffic to it.
+
+    python compare.py leaf.jpg --primary openai --candidate local
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from agents import TomatoAnalysisAgent
+from backends import BackendRouter, load_backend_config
+from findings import FINDINGS_FIELDS, finding_labels
+from preprocess import PreparedImage, load_upload
+
+# Categorical fields that should match exactly between backends
+CATEGORICAL_FIELDS = {
+    "pathology": ["pathogen_type", "disease_stage"],
+    "entomology": ["infestation_level"],
+    "nutrition": ["soil_ph_indication"],
+    "environmental": [],
+}
+
+
+def agreement(primary: Dict[str, Any], candidate: Dict[str, Any], agent_key: str) -> Dict[str, Any]:
+    """Jaccard overlap of findings plus exact-match rate of categorical fields"""
+    a, b = finding_labels(primary, agent_key), finding_labels(candidate, agent_key)
+    jaccard = len(a & b) / len(a | b) if (a or b) else 1.0
+    fields = CATEGORICAL_FIELDS[agent_key]
+    matches = [
+        str(primary.get(field, "")).strip().lower() == str(candidate.get(field, "")).strip().lower()
+        for field in fields
+    ]
+    return {
+        "findings_jaccard": round(jaccard, 3),
+        "categorical_match": round(sum(matches) / len(matches), 3) if matches else None,
+        "only_primary": sorted(a - b),
+        "only_candidate": sorted(b - a),
+    }
+
+
+def _timed(agent: TomatoAnalysisAgent, agent_key: str,
+           image: Union[Image.Image, PreparedImage]) -> Tuple[Dict[str, Any], float]:
+    start = time.perf_counter()
+    result = agent._run_vision_agent(agent_key, image)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def compare_backends(router: BackendRouter, image: Union[Image.Image, PreparedImage],
+                     primary: str, candidate: str,
+                     agent_keys: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Run each image agent on both backends concurrently and compare latency and findings"""
+    agent_keys = agent_keys or list(FINDINGS_FIELDS)
+    if not isinstance(image, PreparedImage):
+        image = PreparedImage.from_image(image)
+    primary_agent = TomatoAnalysisAgent(router=router.with_backend(primary))
+    candidate_agent = TomatoAnalysisAgent(router=router.with_backend(candidate))
+
+    with ThreadPoolExecutor(max_workers=2 * len(agent_keys)) as pool:
+        futures = {
+            agent_key: (
+                pool.submit(_timed, primary_agent, agent_key, image),
+                pool.submit(_timed, candidate_agent, agent_key, image),
+            )
+            for agent_key in agent_keys
+        }
+        report = {}
+        for agent_key, (primary_future, candidate_future) in futures.items():
+            primary_result, primary_ms = primary_future.result()
+            candidate_result, candidate_ms = candidate_future.result()
+            entry = {
+                "primary_latency_ms": round(primary_ms, 1),
+                "candidate_latency_ms": round(candidate_ms, 1),
+                "primary_error": primary_result.get("error"),
+                "candidate_error": candidate_result.get("error"),
+            }
+            if not entry["primary_error"] and not entry["candidate_error"]:
+                entry.update(agreement(primary_result, candidate_result, agent_key))
+            report[agent_key] = entry
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two vision backends on one image")
+    parser.add_argument("image")
+    parser.add_argument("--primary", default="openai")
+    parser.add_argument("--candidate", required=True)
+    parser.add_argument("--config", default=None, help="Backend config JSON or path (defaults to $VISION_BACKENDS)")
+    args = parser.parse_args()
+
+    router = BackendRouter.from_config(load_backend_config(args.config))
+    for name, status in router.health_check().items():
+        state = "ok" if status["ok"] else f"DOWN ({status['error']})"
+        print(f"[{name}] {status['base_url']} model={status['model']} {state} {status['latency_ms']}ms")
+
+    image, _ = load_upload(args.image)
+    for agent_key, entry in compare_backends(router, image, args.primary, args.candidate).items():
+        print(f"\n{agent_key}:")
+        for field, value in entry.items():
+            print(f"  {field}: {value}")
+
+
+if __name__ == "__main__":
+    main()
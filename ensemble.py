@@ -0,0 +1,103 @@
+"""Self-consistency voting over repeated pathology samples.
+
+The pathology agent is sampled several times on the same image. Each sample
+casts one vote for its primary diagnosis (its highest-confidence disease, or
+"healthy" when it reports none); once a quorum of samples agrees the
+remaining requests can be cancelled. The completed samples are then merged:
+a disease is kept when a majority of them list it, with its confidence
+averaged over the samples that did.
+"""
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from findings import parse_finding, strip_confidence
+
+HEALTHY = "healthy"
+
+
+def default_quorum(samples: int) -> int:
+    """Simple majority of the requested samples"""
+    return samples // 2 + 1
+
+
+def _findings(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Parsed diseases_identified entries: label, confidence and display text"""
+    findings = []
+    for item in result.get("diseases_identified", []) or []:
+        label, confidence = parse_finding(item)
+        if label and label not in {finding["label"] for finding in findings}:
+            findings.append({"label": label, "confidence": confidence, "display": strip_confidence(item)})
+    return findings
+
+
+def primary_diagnosis(result: Dict[str, Any]) -> str:
+    """Highest-confidence disease of one sample; list order breaks ties"""
+    findings = _findings(result)
+    if not findings:
+        return HEALTHY
+    return max(findings, key=lambda finding: finding["confidence"] or 0.0)["label"]
+
+
+def quorum_reached(results: List[Dict[str, Any]], quorum: int) -> Optional[str]:
+    """Primary diagnosis shared by at least `quorum` samples, if any"""
+    votes = Counter(primary_diagnosis(result) for result in results)
+    if votes:
+        label, count = votes.most_common(1)[0]
+        if count >= quorum:
+            return label
+    return None
+
+
+def merge_samples(results: List[Dict[str, Any]], requested: int, quorum: int,
+                  failed: int = 0, cancelled: Optional[int] = None) -> Dict[str, Any]:
+    """Merge completed samples into one pathology result with an `ensemble` summary.
+    
+    `cancelled` counts requests that were still in flight when the vote
+    ended; by default every request that neither completed nor failed.
+    Samples that finished but were not counted are reported as unused.
+    """
+    if cancelled is None:
+        cancelled = requested - len(results) - failed
+    primary_votes = Counter(primary_diagnosis(result) for result in results)
+    winner, winner_votes = primary_votes.most_common(1)[0]
+
+    mentions: Dict[str, List[Dict[str, Any]]] = {}
+    for result in results:
+        for finding in _findings(result):
+            mentions.setdefault(finding["label"], []).append(finding)
+
+    majority = len(results) // 2 + 1
+    diseases = []
+    for label, found in mentions.items():
+        if len(found) < majority:
+            continue
+        confidences = [finding["confidence"] for finding in found if finding["confidence"] is not None]
+        average = sum(confidences) / len(confidences) if confidences else None
+        diseases.append((len(found), average or 0.0, found[0]["display"], average))
+    diseases.sort(key=lambda entry: (entry[0], entry[1]), reverse=True)
+
+    # Narrative fields come from the most confident sample that voted for the winner
+    voters = [result for result in results if primary_diagnosis(result) == winner]
+    representative = max(
+        voters,
+        key=lambda result: max((f["confidence"] or 0.0 for f in _findings(result)), default=0.0),
+    )
+
+    merged = dict(representative)
+    merged["diseases_identified"] = [
+        f"{display} - {average:.0f}%" if average is not None else display
+        for _, _, display, average in diseases
+    ]
+    merged["ensemble"] = {
+        "requested": requested,
+        "completed": len(results),
+        "failed": failed,
+        "cancelled": cancelled,
+        "unused": requested - len(results) - failed - cancelled,
+        "quorum": quorum,
+        "quorum_reached": winner_votes >= quorum,
+        "primary_diagnosis": winner,
+        "agreement": round(winner_votes / len(results), 3),
+        "votes": dict(primary_votes.most_common()),
+    }
+    return merged
@@ -0,0 +1,37 @@
+"""Parsing helpers for the free-text findings lists the image agents return"""
+import re
+from typing import Dict, Any, Optional, Set, Tuple
+
+# The list field that carries each image agent's main findings
+FINDINGS_FIELDS = {
+    "pathology": "diseases_identified",
+    "entomology": "pest_damage_detected",
+    "nutrition": "nutrient_deficiencies",
+    "environmental": "stress_factors",
+}
+
+_PERCENT = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+_PARENTHETICAL = re.compile(r"\([^)]*\)")
+
+
+def parse_finding(text: str) -> Tuple[str, Optional[float]]:
+    """Split a finding like 'Early Blight (Alternaria solani) - 85%' into ('early blight', 85.0)"""
+    text = str(text)
+    match = _PERCENT.search(text)
+    confidence = float(match.group(1)) if match else None
+    label = _PERCENT.sub("", text)
+    label = _PARENTHETICAL.sub("", label)
+    label = re.split(r"\s[-–:]\s|:", label)[0]
+    label = re.sub(r"[^a-z0-9 ]+", " ", label.lower())
+    return " ".join(label.split()), confidence
+
+
+def strip_confidence(text: str) -> str:
+    """Finding text without its confidence, e.g. 'Early Blight (Alternaria solani)'"""
+    return _PERCENT.sub("", str(text)).strip(" -–:,")
+
+
+def finding_labels(result: Dict[str, Any], agent_key: str) -> Set[str]:
+    labels = {parse_finding(item)[0] for item in result.get(FINDINGS_FIELDS[agent_key], []) or []}
+    labels.discard("")
+    return labels
@@ -0,0 +1,52 @@
+"""Import hooks that defer loading modules until they are first imported"""
+import importlib
+import importlib.abc
+import importlib.machinery
+import sys
+from types import ModuleType
+from typing import Optional
+
+
+class _AliasLoader(importlib.abc.Loader):
+    def __init__(self, module: ModuleType):
+        self.module = module
+
+    def create_module(self, spec) -> ModuleType:
+        return self.module
+
+    def exec_module(self, module: ModuleType):
+        pass
+
+
+class _AliasFinder(importlib.abc.MetaPathFinder):
+    """Resolve `alias` to `target` the first time anything imports `alias`"""
+
+    def __init__(self, alias: str, target: str):
+        self.alias = alias
+        self.target = target
+
+    def find_spec(self, fullname: str, path=None, target=None) -> Optional[importlib.machinery.ModuleSpec]:
+        if fullname != self.alias:
+            return None
+        # One-shot: later imports hit sys.modules directly
+        sys.meta_path.remove(self)
+        try:
+            module = importlib.import_module(self.target)
+        except ImportError:
+            # Fall back to the regular module when the replacement is not installed
+            return None
+        sys.modules.pop(self.target, None)
+        return importlib.machinery.ModuleSpec(fullname, _AliasLoader(module))
+
+
+def alias_module_lazily(alias: str, target: str):
+    """Make `import alias` load `target` instead, without importing anything now.
+
+    Equivalent to ``sys.modules[alias] = importlib.import_module(target)`` but
+    the cost is only paid if and when `alias` is imported.
+    """
+    if alias in sys.modules:
+        return
+    if any(isinstance(f, _AliasFinder) and f.alias == alias for f in sys.meta_path):
+        return
+    sys.meta_path.insert(0, _AliasFinder(alias, target))
@@ -0,0 +1,285 @@
+"""Local leaf segmentation and region-of-interest cropping before upload.
+
+Field photos usually contain soil, hands, stakes and sky around the leaf.
+The leaf is located locally with NumPy (HSV thresholding + morphology), the
+image is cropped to its bounding box, and optionally the most lesion-dense
+regions are cut out as zoomed tiles.
+
+At detail=high the model sees at most 768 px on the short side, so a
+typical photo costs ~765 image tokens whether or not it is cropped (see
+benchmarks/bench_preprocess.py). Cropping buys resolution rather than
+tokens: the leaf fills those 768 px instead of sharing them with the
+background. Tokens only drop when the crop is small or much narrower than
+the frame; each 512 px lesion tile adds 255 tokens.
+"""
+import base64
+import io
+import warnings
+from dataclasses import dataclass, field
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Size the mask is computed at; segmentation does not need full resolution
+MASK_SIDE = 512
+# OpenAI high-detail images are scaled to fit 2048x2048 and then so the short
+# side is at most 768 px; pixels beyond that only add upload bytes
+MAX_UPLOAD_SIDE = 2048
+MAX_SHORT_SIDE = 768
+
+# Working resolution for decoded uploads: enough headroom to crop a small
+# leaf out of a wide frame and still fill the effective upload resolution
+DECODE_SIDE = 3072
+# Refuse anything larger than this before decoding (48 MP camera files fit)
+MAX_INPUT_PIXELS = 64_000_000
+
+# EXIF orientation tag
+ORIENTATION_TAG = 0x0112
+
+# HSV thresholds on PIL's 0-255 scale (hue 35-110 is roughly 50-155 degrees: yellow-green to green)
+LEAF_HUE = (35, 110)
+LEAF_MIN_SATURATION = 40
+LEAF_MIN_VALUE = 35
+
+
+@dataclass
+class PreparedImage:
+    """Image payload for the agents: the main (possibly cropped) image plus zoomed tiles.
+
+    ``image`` is None when the payload was loaded already encoded, e.g. from
+    the blob store.
+    """
+    image: Optional[Image.Image]
+    tiles: List[Image.Image] = field(default_factory=list)
+    crop_box: Optional[Tuple[int, int, int, int]] = None
+    leaf_fraction: float = 1.0
+    _payload: Optional[List[str]] = field(default=None, repr=False)
+
+    @classmethod
+    def from_image(cls, image: Image.Image) -> "PreparedImage":
+        """Wrap an image without segmentation"""
+        return cls(image=_limit_for_detail(_rgb(image)))
+
+    @classmethod
+    def from_payload(cls, payload: List[str], crop_box: Optional[Tuple[int, int, int, int]] = None,
+                     leaf_fraction: float = 1.0) -> "PreparedImage":
+        """Wrap base64 JPEGs that were encoded earlier, without decoding them"""
+        return cls(image=None, crop_box=crop_box, leaf_fraction=leaf_fraction, _payload=list(payload))
+
+    def payload(self) -> List[str]:
+        """Base64 JPEGs (main image first, then tiles), encoded once and reused by every agent"""
+        if self._payload is None:
+            self._payload = [encode_jpeg(img) for img in [self.image, *self.tiles]]
+        return self._payload
+
+    def payload_bytes(self) -> int:
+        """Total size of the encoded payload as sent over the wire"""
+        return sum(len(item) for item in self.payload())
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the pixel ceiling or looks like a decompression bomb"""
+
+
+@dataclass(frozen=True)
+class UploadInfo:
+    """What was uploaded versus what was actually decoded, both upright (EXIF orientation applied)"""
+    format: Optional[str]
+    original_size: Tuple[int, int]
+    decoded_size: Tuple[int, int]
+
+
+def load_upload(source: Union[str, BinaryIO], decode_side: int = DECODE_SIDE,
+                max_pixels: int = MAX_INPUT_PIXELS) -> Tuple[Image.Image, UploadInfo]:
+    """Decode an upload with bounded memory.
+
+    The pixel count is checked from the header before any pixel data is
+    decoded. JPEGs are decoded in draft mode, which lets libjpeg scale by
+    1/2, 1/4 or 1/8 while decoding, so a 48 MP photo never exists at full
+    size. EXIF orientation is applied on the reduced image, and the result is
+    an RGB image whose long side is at most ``decode_side``.
+    """
+    try:
+        with warnings.catch_warnings():
+            # Pillow only warns between MAX_IMAGE_PIXELS and twice that; treat it as fatal
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(source) as img:
+                # Stored (unrotated) size: draft() and the pixel ceiling work on this
+                stored_size = img.size
+                image_format = img.format
+                if stored_size[0] * stored_size[1] > max_pixels:
+                    raise ImageTooLargeError(
+                        f"Image is {stored_size[0]}x{stored_size[1]} "
+                        f"({stored_size[0] * stored_size[1] / 1e6:.0f} MP); "
+                        f"the limit is {max_pixels / 1e6:.0f} MP"
+                    )
+                # Report the size upright, like decoded_size (EXIF 5-8 swap width and height)
+                original_size = stored_size
+                if img.getexif().get(ORIENTATION_TAG) in (5, 6, 7, 8):
+                    original_size = stored_size[::-1]
+                scale = min(1.0, decode_side / max(stored_size))
+                draft_size = (max(1, int(stored_size[0] * scale)), max(1, int(stored_size[1] * scale)))
+                img.draft("RGB", draft_size)
+                # Shrink in place so only the reduced image is ever copied
+                img.thumbnail((decode_side, decode_side), Image.LANCZOS)
+                image = ImageOps.exif_transpose(img)
+                if image is img:
+                    image = img.copy()
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        raise ImageTooLargeError(str(e)) from e
+
+    return _rgb(image), UploadInfo(image_format, original_size, image.size)
+
+
+def encode_jpeg(image: Image.Image) -> str:
+    """Convert PIL Image to base64 JPEG string"""
+    buffered = io.BytesIO()
+    _rgb(image).save(buffered, format="JPEG")
+    return base64.b64encode(buffered.getvalue()).decode()
+
+
+def _rgb(image: Image.Image) -> Image.Image:
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def _box_sum(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Sum of mask values over a (2r+1)x(2r+1) window at every pixel, via an integral image"""
+    h, w = mask.shape
+    size = 2 * radius + 1
+    integral = np.zeros((h + size, w + size), dtype=np.int32)
+    integral[1:, 1:] = np.pad(mask.astype(np.int32), radius).cumsum(0).cumsum(1)
+    return (integral[size:size + h, size:size + w] - integral[:h, size:size + w]
+            - integral[size:size + h, :w] + integral[:h, :w])
+
+
+def dilate(mask: np.ndarray, radius: int) -> np.ndarray:
+    return _box_sum(mask, radius) > 0
+
+
+def erode(mask: np.ndarray, radius: int) -> np.ndarray:
+    return _box_sum(mask, radius) == (2 * radius + 1) ** 2
+
+
+def leaf_mask(image: Image.Image) -> np.ndarray:
+    """Boolean mask of leaf-green pixels after opening (remove specks) and closing (fill lesions)"""
+    hsv = np.asarray(_rgb(image).convert("HSV"))
+    hue, sat, val = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    green = (
+        (hue >= LEAF_HUE[0]) & (hue <= LEAF_HUE[1])
+        & (sat >= LEAF_MIN_SATURATION) & (val >= LEAF_MIN_VALUE)
+    )
+    radius = max(1, min(green.shape) // 128)
+    opened = dilate(erode(green, radius), radius)
+    return erode(dilate(opened, radius * 4), radius * 4)
+
+
+def lesion_mask(image: Image.Image, leaf: np.ndarray) -> np.ndarray:
+    """Non-green pixels enclosed by the leaf: spots, necrosis, chlorosis"""
+    hsv = np.asarray(_rgb(image).convert("HSV"))
+    hue, sat = hsv[..., 0], hsv[..., 1]
+    healthy = (hue >= LEAF_HUE[0] + 10) & (hue <= LEAF_HUE[1]) & (sat >= LEAF_MIN_SATURATION)
+    return leaf & ~healthy
+
+
+def _mask_bbox(mask: np.ndarray, margin: float) -> Optional[Tuple[int, int, int, int]]:
+    ys, xs = np.nonzero(mask)
+    if len(xs) == 0:
+        return None
+    # Percentile trimming keeps a few stray pixels from blowing up the box
+    x0, x1 = np.percentile(xs, [0.5, 99.5])
+    y0, y1 = np.percentile(ys, [0.5, 99.5])
+    h, w = mask.shape
+    pad_x, pad_y = (x1 - x0) * margin, (y1 - y0) * margin
+    return (
+        int(max(0, x0 - pad_x)), int(max(0, y0 - pad_y)),
+        int(min(w, x1 + pad_x + 1)), int(min(h, y1 + pad_y + 1)),
+    )
+
+
+def _densest_windows(density: np.ndarray, window: int, count: int,
+                     min_density: float) -> List[Tuple[int, int]]:
+    """Top-left corners of the `count` most lesion-dense, non-overlapping windows"""
+    h, w = density.shape
+    if window > min(h, w):
+        return []
+    integral = np.pad(density.astype(np.float64), ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    sums = (integral[window:, window:] - integral[:-window, window:]
+            - integral[window:, :-window] + integral[:-window, :-window]) / (window * window)
+    stride = max(1, window // 4)
+    candidates = [
+        (sums[y, x], y, x)
+        for y in range(0, sums.shape[0], stride)
+        for x in range(0, sums.shape[1], stride)
+        if sums[y, x] >= min_density
+    ]
+    candidates.sort(reverse=True)
+    chosen: List[Tuple[int, int]] = []
+    for _, y, x in candidates:
+        if all(abs(y - cy) >= window or abs(x - cx) >= window for cy, cx in chosen):
+            chosen.append((y, x))
+            if len(chosen) == count:
+                break
+    return chosen
+
+
+def _limit_side(image: Image.Image, max_side: int) -> Image.Image:
+    if max(image.size) <= max_side:
+        return image
+    resized = image.copy()
+    resized.thumbnail((max_side, max_side), Image.LANCZOS)
+    return resized
+
+
+def _limit_for_detail(image: Image.Image, max_side: int = MAX_UPLOAD_SIDE,
+                      max_short_side: int = MAX_SHORT_SIDE) -> Image.Image:
+    """Downscale to the resolution the model actually sees at detail=high"""
+    width, height = image.size
+    scale = min(1.0, max_side / max(width, height), max_short_side / min(width, height))
+    if scale >= 1.0:
+        return image
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def prepare_leaf_image(image: Image.Image, tiles: int = 0, margin: float = 0.05,
+                       min_leaf_fraction: float = 0.02, tile_fraction: float = 0.25,
+                       tile_side: int = 512, min_lesion_density: float = 0.05,
+                       max_side: int = MAX_UPLOAD_SIDE, max_short_side: int = MAX_SHORT_SIDE) -> PreparedImage:
+    """Crop the image to the leaf and optionally cut zoomed tiles of the most lesion-dense regions.
+
+    Falls back to the whole frame when too little leaf is found, so an unusual
+    photo is never cropped to noise.
+    """
+    image = _rgb(image)
+    small = _limit_side(image, MASK_SIDE)
+    scale_x, scale_y = image.width / small.width, image.height / small.height
+
+    leaf = leaf_mask(small)
+    leaf_fraction = float(leaf.mean())
+    bbox = _mask_bbox(leaf, margin) if leaf_fraction >= min_leaf_fraction else None
+    if bbox is None:
+        return PreparedImage(image=_limit_for_detail(image, max_side, max_short_side), leaf_fraction=leaf_fraction)
+
+    crop_box = (
+        int(bbox[0] * scale_x), int(bbox[1] * scale_y),
+        int(np.ceil(bbox[2] * scale_x)), int(np.ceil(bbox[3] * scale_y)),
+    )
+    prepared = PreparedImage(
+        image=_limit_for_detail(image.crop(crop_box), max_side, max_short_side),
+        crop_box=crop_box,
+        leaf_fraction=leaf_fraction,
+    )
+
+    if tiles > 0:
+        x0, y0, x1, y1 = bbox
+        lesions = lesion_mask(small, leaf)[y0:y1, x0:x1]
+        window = max(8, int(min(x1 - x0, y1 - y0) * tile_fraction))
+        for ty, tx in _densest_windows(lesions, window, tiles, min_lesion_density):
+            box = (
+                int((x0 + tx) * scale_x), int((y0 + ty) * scale_y),
+                int((x0 + tx + window) * scale_x), int((y0 + ty + window) * scale_y),
+            )
+            tile = image.crop(box)
+            prepared.tiles.append(tile.resize((tile_side, tile_side), Image.LANCZOS))
+    return prepared
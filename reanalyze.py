@@ -0,0 +1,142 @@
+"""Incremental re-analysis of the stored history after prompt or model changes.
+
+Every analysis records a fingerprint per agent (prompt, routed model and
+request parameters). For each image in the blob store this re-runs only the
+agents whose fingerprint no longer matches their latest stored result, plus
+the treatment coordinator when any of its inputs changes, and stores the
+merged result as a new analysis. Images are processed in parallel. The
+report compares the calls and cost with re-running all five agents.
+
+    python reanalyze.py --dry-run      # list what would be recomputed
+    python reanalyze.py --workers 4
+"""
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
+
+from agents import TomatoAnalysisAgent
+from backends import BackendRouter, load_backend_config
+from blobstore import DEFAULT_ROOT, BlobStore
+from prompts import AGENT_PROMPTS
+
+# USD per 1M tokens: (input, cached input, output); update when pricing changes
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+
+def usage_cost(stats: Dict[str, Any]) -> Optional[float]:
+    """Estimated USD cost of one agent's recorded usage, or None for unpriced (e.g. local) models"""
+    prices = MODEL_PRICES.get(stats.get("model"))
+    if prices is None:
+        return None
+    cached = stats.get("cached_tokens", 0)
+    uncached = stats.get("prompt_tokens", 0) - cached
+    return (uncached * prices[0] + cached * prices[1] + stats.get("completion_tokens", 0) * prices[2]) / 1e6
+
+
+def _tally(usage: List[Dict[str, Any]]) -> Dict[str, Any]:
+    costs = [usage_cost(stats) for stats in usage]
+    return {
+        "calls": sum(stats.get("calls", 1) for stats in usage),
+        "tokens": sum(stats.get("prompt_tokens", 0) + stats.get("completion_tokens", 0) for stats in usage),
+        "cost": sum(cost for cost in costs if cost is not None),
+        "unpriced_calls": sum(stats.get("calls", 1) for stats, cost in zip(usage, costs) if cost is None),
+    }
+
+
+def reanalyze_image(router: BackendRouter, store: BlobStore, key: str, pathology_samples: Optional[int] = None,
+                    force: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+    """Bring one stored image's latest analysis up to date; returns a summary for the report"""
+    summary = {"key": key, "recomputed": [], "made": _tally([]), "saved": _tally([])}
+    previous = store.latest_analysis(key)
+    if previous is None or "error" in previous:
+        summary["status"] = "never analyzed"
+        return summary
+
+    agent = TomatoAnalysisAgent(router=router)
+    stale = list(AGENT_PROMPTS) if force else agent.stale_agents(previous, pathology_samples)
+    if not stale:
+        summary["status"] = "up to date"
+        summary["saved"] = _tally(list(previous.get("usage", {}).values()))
+        return summary
+    if dry_run:
+        summary["status"] = "stale"
+        summary["recomputed"] = stale
+        return summary
+
+    results = agent.reanalyze(store.load_prepared(key), previous, pathology_samples, force=force)
+    if "error" in results:
+        summary["status"] = f"failed: {results['error']}"
+        return summary
+    store.add_analysis(key, results)
+
+    usage = results["usage"].values()
+    summary["status"] = "reanalyzed"
+    summary["recomputed"] = results["reanalysis"]["recomputed"]
+    summary["made"] = _tally([stats for stats in usage if not stats.get("reused")])
+    summary["saved"] = _tally([stats for stats in usage if stats.get("reused")])
+    return summary
+
+
+def reanalyze_history(router: BackendRouter, store: BlobStore, workers: int = 4,
+                      pathology_samples: Optional[int] = None, force: bool = False,
+                      dry_run: bool = False, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Re-analyze every stored image with at most `workers` images in flight"""
+    keys = [record["key"] for record in store.history(limit=limit) if record["analyses"]]
+    summaries = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [
+            pool.submit(reanalyze_image, router, store, key, pathology_samples, force, dry_run)
+            for key in keys
+        ]
+        for future in as_completed(futures):
+            summary = future.result()
+            recomputed = ", ".join(summary["recomputed"]) or "-"
+            print(f"{summary['key'][:12]}  {summary['status']:<12}  {recomputed}")
+            summaries.append(summary)
+    return summaries
+
+
+def _format_totals(label: str, summaries: List[Dict[str, Any]], field: str) -> str:
+    calls = sum(s[field]["calls"] for s in summaries)
+    tokens = sum(s[field]["tokens"] for s in summaries)
+    cost = sum(s[field]["cost"] for s in summaries)
+    unpriced = sum(s[field]["unpriced_calls"] for s in summaries)
+    line = f"{label}: {calls} calls, {tokens:,} tokens, ~${cost:.4f}"
+    if unpriced:
+        line += f" (+{unpriced} calls on unpriced models)"
+    return line
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=os.getenv("BLOB_STORE_DIR", DEFAULT_ROOT))
+    parser.add_argument("--config", default=None, help="Backend config JSON or path (defaults to $VISION_BACKENDS)")
+    parser.add_argument("--workers", type=int, default=4, help="Images re-analyzed at the same time")
+    parser.add_argument("--pathology-samples", type=int, default=None,
+                        help="Pathology ensemble size (defaults to what each analysis used)")
+    parser.add_argument("--limit", type=int, default=None, help="Only the N most recently analyzed images")
+    parser.add_argument("--force", action="store_true", help="Re-run every agent")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which agents are stale")
+    args = parser.parse_args(argv)
+
+    router = BackendRouter.from_config(load_backend_config(args.config), api_key=os.getenv("OPENAI_API_KEY"))
+    summaries = reanalyze_history(router, BlobStore(args.store), workers=args.workers,
+                                  pathology_samples=args.pathology_samples, force=args.force,
+                                  dry_run=args.dry_run, limit=args.limit)
+
+    statuses: Dict[str, int] = {}
+    for summary in summaries:
+        status = summary["status"].split(":")[0]
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"\n{len(summaries)} images: " + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items())))
+    if not args.dry_run:
+        print(_format_totals("Spent", summaries, "made"))
+        print(_format_totals("Saved vs. full re-run", summaries, "saved"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Record/replay transport for the OpenAI client.
+
+Requests are keyed by a hash of the method, path and canonical JSON body and
+stored as one JSON cassette per key. In ``record`` mode requests go to the real
+API and the responses are saved; in ``replay`` mode responses are served from
+the cassettes only, so analyses run without network access, cost or variance.
+
+Usage:
+    client = make_http_client("replay", "cassettes")
+    agent = TomatoAnalysisAgent(api_key="replay", http_client=client)
+"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, Any, Optional
+
+import httpx
+
+MODES = ("off", "record", "replay")
+
+
+def request_key(method: str, path: str, body: bytes) -> str:
+    """Stable hash for a request; JSON bodies are canonicalized first"""
+    try:
+        canonical = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+    except ValueError:
+        canonical = body
+    digest = hashlib.sha256()
+    digest.update(method.upper().encode())
+    digest.update(b"\n")
+    digest.update(path.encode())
+    digest.update(b"\n")
+    digest.update(canonical)
+    return digest.hexdigest()
+
+
+class _CassetteStore:
+    """Cassette lookup and persistence shared by the sync and async transports"""
+
+    def __init__(self, cassette_dir: str, mode: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported cassette mode: {mode}")
+        self.cassette_dir = cassette_dir
+        self.mode = mode
+        os.makedirs(cassette_dir, exist_ok=True)
+
+    def cassette_path(self, key: str) -> str:
+        return os.path.join(self.cassette_dir, f"{key}.json")
+
+    def _key(self, request: httpx.Request) -> str:
+        return request_key(request.method, request.url.path, request.content)
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.cassette_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save(self, key: str, cassette: Dict[str, Any]):
+        # Write to a temp file and rename so concurrent recorders never leave
+        # a half-written cassette behind
+        fd, tmp_path = tempfile.mkstemp(dir=self.cassette_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cassette, f, indent=2)
+        os.replace(tmp_path, self.cassette_path(key))
+
+    @staticmethod
+    def _to_response(cassette: Dict[str, Any], request: httpx.Request) -> httpx.Response:
+        recorded = cassette["response"]
+        return httpx.Response(
+            status_code=recorded["status_code"],
+            headers={"content-type": recorded.get("content_type", "application/json")},
+            content=recorded["body"].encode("utf-8"),
+            request=request,
+        )
+
+    def _store(self, key: str, request: httpx.Request, response: httpx.Response, body: bytes) -> Dict[str, Any]:
+        cassette = {
+            "request": {
+                "method": request.method,
+                "path": request.url.path,
+                "model": _request_model(request),
+            },
+            "response": {
+                "status_code": response.status_code,
+                "content_type": response.headers.get("content-type", "application/json"),
+                "body": body.decode("utf-8"),
+            },
+        }
+        # Only successful calls are worth replaying
+        if response.status_code < 400:
+            self._save(key, cassette)
+        return cassette
+
+
+class CassetteTransport(_CassetteStore, httpx.BaseTransport):
+    """httpx transport that records responses to, or replays them from, cassettes"""
+
+    def __init__(self, cassette_dir: str, mode: str = "replay",
+                 upstream: Optional[httpx.BaseTransport] = None):
+        super().__init__(cassette_dir, mode)
+        self.upstream = upstream or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        key = self._key(request)
+        cassette = self._load(key)
+        if cassette is None:
+            if self.mode == "replay":
+                return _missing_cassette_response(key, request)
+            response = self.upstream.handle_request(request)
+            try:
+                body = response.read()
+            finally:
+                response.close()
+            cassette = self._store(key, request, response, body)
+        return self._to_response(cassette, request)
+
+    def close(self):
+        self.upstream.close()
+
+
+class AsyncCassetteTransport(_CassetteStore, httpx.AsyncBaseTransport):
+    """Async variant of CassetteTransport for AsyncOpenAI clients"""
+
+    def __init__(self, cassette_dir: str, mode: str = "replay",
+                 upstream: Optional[httpx.AsyncBaseTransport] = None):
+        super().__init__(cassette_dir, mode)
+        self.upstream = upstream or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        key = self._key(request)
+        cassette = self._load(key)
+        if cassette is None:
+            if self.mode == "replay":
+                return _missing_cassette_response(key, request)
+            response = await self.upstream.handle_async_request(request)
+            try:
+                body = await response.aread()
+            finally:
+                await response.aclose()
+            cassette = self._store(key, request, response, body)
+        return self._to_response(cassette, request)
+
+    async def aclose(self):
+        await self.upstream.aclose()
+
+
+def _request_model(request: httpx.Request) -> Optional[str]:
+    try:
+        return json.loads(request.content).get("model")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _missing_cassette_response(key: str, request: httpx.Request) -> httpx.Response:
+    # A 404 surfaces as a readable APIStatusError and is not retried by the client
+    return httpx.Response(
+        status_code=404,
+        json={"error": {"message": f"No cassette recorded for request {key}", "type": "cassette_miss"}},
+        request=request,
+    )
+
+
+def make_http_client(mode: str = "off", cassette_dir: str = "cassettes") -> Optional[httpx.Client]:
+    """Build an httpx client for the given cassette mode, or None for the default client"""
+    if mode not in MODES:
+        raise ValueError(f"Unsupported cassette mode: {mode}. Expected one of {MODES}")
+    if mode == "off":
+        return None
+    return httpx.Client(transport=CassetteTransport(cassette_dir, mode=mode), timeout=600)
+
+
+def make_async_http_client(mode: str = "off", cassette_dir: str = "cassettes") -> Optional[httpx.AsyncClient]:
+    """Async counterpart of make_http_client"""
+    if mode not in MODES:
+        raise ValueError(f"Unsupported cassette mode: {mode}. Expected one of {MODES}")
+    if mode == "off":
+        return None
+    return httpx.AsyncClient(transport=AsyncCassetteTransport(cassette_dir, mode=mode), timeout=600)
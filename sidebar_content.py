@@ -0,0 +1,99 @@
+"""Static sidebar reference content.
+
+Everything here is built once when the module is first imported and reused
+on every Streamlit rerun, instead of being rebuilt by the script each time.
+"""
+import textwrap
+from typing import Dict, List, Tuple
+
+
+def _md(text: str) -> str:
+    return textwrap.dedent(text).strip()
+
+
+AGENT_CAPABILITIES: Tuple[Tuple[str, str], ...] = (
+    ("🦠 Plant Pathology Agent", _md("""
+        **Detects 30+ diseases:**
+        - **Fungal**: Early Blight, Late Blight, Septoria, Target Spot, Anthracnose, Powdery Mildew, Fusarium Wilt, etc.
+        - **Bacterial**: Bacterial Spot, Bacterial Speck, Bacterial Wilt, Bacterial Canker
+        - **Viral**: TMV, ToMV, TSWV, CMV, TYLCV, TBSV
+    """)),
+    ("🐛 Entomology Agent", _md("""
+        **Identifies pest damage:**
+        - **Insects**: Hornworms, Aphids, Whiteflies, Thrips, Spider Mites, Flea Beetles
+        - **Damage Patterns**: Feeding holes, stippling, tunnels, distortion
+        - **Beneficial Insects**: Natural predators and biological control
+    """)),
+    ("🌱 Nutrition Agent", _md("""
+        **Diagnoses deficiencies:**
+        - **Macronutrients**: N, P, K, Ca, Mg, S
+        - **Micronutrients**: Fe, Mn, Zn, B, Cu, Mo
+        - **Disorders**: Blossom end rot, catfacing, cracking, sunscald
+    """)),
+    ("🌤️ Environmental Agent", _md("""
+        **Analyzes stress factors:**
+        - **Abiotic Stress**: Heat, cold, water, light, wind, chemicals
+        - **Growing Conditions**: Humidity, air circulation, soil health
+        - **Management**: Irrigation, climate control recommendations
+    """)),
+    ("💊 Treatment Coordinator", _md("""
+        **Integrated management:**
+        - **Treatment Priority**: Immediate vs. long-term actions
+        - **Organic Solutions**: Natural and biological controls
+        - **Chemical Options**: Conventional treatments when needed
+        - **Prevention**: Cultural practices and resistance management
+    """)),
+)
+
+IMAGE_GUIDELINES = _md("""
+    **For best results:**
+    - 🔆 Good lighting (natural light preferred)
+    - 🎯 Sharp focus on symptoms
+    - 📏 Close-up of affected areas
+    - 🍃 Include both healthy and affected tissue
+    - 📱 High resolution (>1MP recommended)
+
+    **Avoid:**
+    - ❌ Blurry or dark images
+    - ❌ Images with heavy shadows
+    - ❌ Too far from subject
+    - ❌ Low resolution photos
+""")
+
+DISEASE_DATABASE: Dict[str, List[str]] = {
+    "Fungal Diseases": [
+        "Early Blight (Alternaria solani)",
+        "Late Blight (Phytophthora infestans)",
+        "Septoria Leaf Spot",
+        "Target Spot (Corynespora cassiicola)",
+        "Anthracnose",
+        "Powdery Mildew",
+        "Downy Mildew",
+        "Fusarium Wilt",
+        "Verticillium Wilt",
+        "Black Mold",
+        "Gray Mold (Botrytis)",
+        "Leaf Mold (Passalora fulva)"
+    ],
+    "Bacterial Diseases": [
+        "Bacterial Spot (Xanthomonas)",
+        "Bacterial Speck (Pseudomonas)",
+        "Bacterial Wilt (Ralstonia)",
+        "Bacterial Canker (Clavibacter)",
+        "Pith Necrosis"
+    ],
+    "Viral Diseases": [
+        "Tomato Mosaic Virus (ToMV)",
+        "Tobacco Mosaic Virus (TMV)",
+        "Tomato Spotted Wilt Virus",
+        "Cucumber Mosaic Virus",
+        "Tomato Yellow Leaf Curl Virus",
+        "Tomato Bushy Stunt Virus"
+    ]
+}
+
+# One markdown block instead of one element per disease
+DISEASE_REFERENCE = "\n\n".join(
+    "\n\n".join([f"**{category}:**"] + [f"• {disease}" for disease in diseases])
+    for category, diseases in DISEASE_DATABASE.items()
+)
@@ -0,0 +1,223 @@
+"""Local OpenAI-compatible stub server for offline testing and benchmarks.
+
+Serves ``POST /v1/chat/completions`` with canned, schema-valid agent responses
+(picked by matching the request's system message against the prompt registry)
+and ``GET /v1/models``. Latency and error rate are configurable so the client
+side can be exercised under slow or flaky upstream conditions.
+
+Run standalone:
+    python stub_server.py --port 8765 --latency-ms 300 --jitter-ms 100 --error-rate 0.05
+    VISION_BACKENDS='{"backends": {"stub": {"base_url": "http://127.0.0.1:8765/v1", "model": "stub"}}, "default": "stub"}' \
+        streamlit run app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+
+from prompts import AGENT_PROMPTS
+
+CANNED_RESPONSES: Dict[str, Dict[str, Any]] = {
+    "pathology": {
+        "agent_name": "Plant Pathology Specialist",
+        "diseases_identified": ["Early Blight (Alternaria solani) - 85%", "Septoria Leaf Spot - 20%"],
+        "pathogen_type": "fungal",
+        "disease_stage": "intermediate",
+        "severity_score": "6",
+        "key_symptoms": ["Brown lesions with concentric rings", "Yellow halo around lesions"],
+        "differential_diagnosis": ["Target Spot", "Septoria Leaf Spot"],
+        "prognosis": "Progressive defoliation from the lower canopy upward"
+    },
+    "entomology": {
+        "agent_name": "Entomology Specialist",
+        "pest_damage_detected": ["Flea Beetles - 15%"],
+        "damage_pattern": "A few small round shot-holes",
+        "pest_lifecycle_stage": "adult damage",
+        "infestation_level": "light",
+        "secondary_issues": ["Entry points for bacterial spot"],
+        "beneficial_insects": ["Lacewings", "Parasitic wasps"]
+    },
+    "nutrition": {
+        "agent_name": "Plant Nutrition Specialist",
+        "nutrient_deficiencies": ["Magnesium (Mg) - 25%"],
+        "physiological_disorders": [],
+        "soil_ph_indication": "neutral",
+        "fertilizer_recommendations": ["Epsom salt foliar spray"],
+        "environmental_factors": ["Leaching after heavy irrigation"]
+    },
+    "environmental": {
+        "agent_name": "Environmental Stress Specialist",
+        "stress_factors": ["High humidity - moderate"],
+        "climate_conditions": ["Warm and humid"],
+        "soil_conditions": ["Adequate moisture"],
+        "water_management": ["Water at the base in the morning"],
+        "microclimate_factors": ["Dense canopy limiting air flow"]
+    },
+    "treatment": {
+        "agent_name": "Treatment Coordinator",
+        "priority_treatments": ["Remove infected lower leaves"],
+        "organic_treatments": ["Copper-based fungicide"],
+        "chemical_treatments": ["Chlorothalonil on a 7-10 day interval"],
+        "cultural_practices": ["Mulch to prevent soil splash"],
+        "prevention_strategies": ["Three-year crop rotation"],
+        "monitoring_schedule": ["Inspect lower leaves twice weekly"],
+        "treatment_timeline": ["Day 0: sanitation, Day 1: first spray"],
+        "resistance_management": ["Rotate FRAC groups"],
+        "integrated_approach": ["Combine sanitation, airflow and targeted sprays"]
+    },
+}
+
+_SYSTEM_TO_AGENT = {prompt.system: key for key, prompt in AGENT_PROMPTS.items()}
+
+
+class StubConfig:
+    """Mutable knobs shared by all request handlers"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 500, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_call(self) -> Tuple[float, bool]:
+        """Return (delay seconds, inject error) for the next request"""
+        with self._lock:
+            self.request_count += 1
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms))
+            fail = self._random.random() < self.error_rate
+        return delay / 1000.0, fail
+
+
+def _agent_for(body: Dict[str, Any]) -> str:
+    # Treatment sends its system text as the system message; image agents
+    # put theirs at the start of the last text part of the user message
+    for message in body.get("messages", []):
+        content = message.get("content")
+        texts = [content] if isinstance(content, str) else [
+            part.get("text", "") for part in content or [] if part.get("type") == "text"
+        ]
+        for text in texts:
+            for system, agent_key in _SYSTEM_TO_AGENT.items():
+                if text.startswith(system):
+                    return agent_key
+    return "pathology"
+
+
+def _completion(body: Dict[str, Any]) -> Dict[str, Any]:
+    agent_key = _agent_for(body)
+    content = json.dumps(CANNED_RESPONSES[agent_key])
+    prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+    return {
+        "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        },
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Request handler implementing the subset of the OpenAI API the agents use"""
+
+    config: StubConfig = StubConfig()
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the request, e.g. an ensemble sample no longer needed
+            pass
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        delay, fail = self.config.next_call()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self._send_json(self.config.error_status, {
+                "error": {"message": "Injected stub error", "type": "stub_error"}
+            })
+            return
+
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+        self._send_json(200, _completion(body))
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0,
+                      config: Optional[StubConfig] = None) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stub in a background thread; returns (server, base_url)"""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config or StubConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server for the tomato agents")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status for injected errors")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.seed)
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Stub OpenAI server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
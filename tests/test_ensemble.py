@@ -0,0 +1,108 @@
+import json
+
+import httpx
+
+from agents import TomatoAnalysisAgent
+from backends import BackendRouter
+from ensemble import HEALTHY, default_quorum, merge_samples, primary_diagnosis, quorum_reached
+from preprocess import PreparedImage
+
+
+def sample(*diseases, **fields):
+    return {"agent_name": "Plant Pathology Specialist", "diseases_identified": list(diseases), **fields}
+
+
+def test_default_quorum_is_a_simple_majority():
+    assert [default_quorum(n) for n in (1, 2, 3, 4, 5)] == [1, 2, 2, 3, 3]
+
+
+def test_primary_diagnosis_picks_highest_confidence():
+    assert primary_diagnosis(sample("Septoria Leaf Spot - 30%", "Early Blight - 85%")) == "early blight"
+
+
+def test_primary_diagnosis_tie_keeps_list_order():
+    assert primary_diagnosis(sample("Late Blight - 50%", "Early Blight - 50%")) == "late blight"
+
+
+def test_primary_diagnosis_healthy_when_nothing_found():
+    assert primary_diagnosis(sample()) == HEALTHY
+    assert primary_diagnosis({"diseases_identified": None}) == HEALTHY
+
+
+def test_quorum_reached():
+    results = [sample("Early Blight - 80%"), sample("Late Blight - 70%"), sample("Early Blight - 60%")]
+    assert quorum_reached(results, 2) == "early blight"
+    assert quorum_reached(results, 3) is None
+    assert quorum_reached([], 1) is None
+
+
+def test_merge_keeps_majority_findings_with_averaged_confidence():
+    results = [
+        sample("Early Blight - 80%", "Septoria Leaf Spot - 20%", prognosis="a"),
+        sample("Early Blight - 90%", prognosis="b"),
+        sample("Early Blight - 70%", "Septoria Leaf Spot - 40%", "Target Spot - 10%", prognosis="c"),
+    ]
+    merged = merge_samples(results, requested=3, quorum=2)
+    assert merged["diseases_identified"] == ["Early Blight - 80%", "Septoria Leaf Spot - 30%"]
+    # Narrative fields come from the most confident voter for the winner
+    assert merged["prognosis"] == "b"
+    assert merged["ensemble"]["votes"] == {"early blight": 3}
+    assert merged["ensemble"]["agreement"] == 1.0
+    assert merged["ensemble"]["quorum_reached"] is True
+
+
+def test_merge_tie_goes_to_the_first_sample():
+    results = [sample("Late Blight - 60%"), sample("Early Blight - 90%")]
+    ensemble = merge_samples(results, requested=3, quorum=2, failed=1)["ensemble"]
+    assert ensemble["primary_diagnosis"] == "late blight"
+    assert ensemble["quorum_reached"] is False
+    assert ensemble["agreement"] == 0.5
+
+
+def test_merge_accounting_with_failed_and_cancelled_samples():
+    results = [sample("Early Blight - 80%"), sample("Early Blight - 60%")]
+    ensemble = merge_samples(results, requested=5, quorum=2, failed=1)["ensemble"]
+    assert (ensemble["completed"], ensemble["failed"], ensemble["cancelled"], ensemble["unused"]) == (2, 1, 2, 0)
+
+    ensemble = merge_samples(results, requested=5, quorum=2, failed=1, cancelled=1)["ensemble"]
+    assert (ensemble["cancelled"], ensemble["unused"]) == (1, 1)
+
+
+def test_merge_all_healthy():
+    merged = merge_samples([sample(), sample()], requested=2, quorum=2)
+    assert merged["diseases_identified"] == []
+    assert merged["ensemble"]["primary_diagnosis"] == HEALTHY
+
+
+def _completion(content: dict) -> dict:
+    return {
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "test",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": json.dumps(content)}}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+    }
+
+
+def test_vote_counts_failed_samples_and_bills_every_response():
+    served = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seed = json.loads(request.content)["seed"]
+        served.append(seed)
+        if seed == 1:
+            return httpx.Response(400, json={"error": {"message": "bad sample", "type": "invalid_request_error"}})
+        return httpx.Response(200, json=_completion(sample("Early Blight - 80%")))
+
+    router = BackendRouter.single(
+        "sk-test", "http://backend.test/v1", model="test",
+        async_http_client_factory=lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    agent = TomatoAnalysisAgent(router=router)
+    result = agent.pathology_agent(PreparedImage.from_payload(["aW1hZ2U="]), samples=3)
+
+    assert sorted(served) == [0, 1, 2]
+    assert result["ensemble"]["completed"] == 2
+    assert result["ensemble"]["failed"] == 1
+    assert result["ensemble"]["cancelled"] == 0
+    assert agent.usage["pathology"]["calls"] == 2
+    assert agent.usage["pathology"]["prompt_tokens"] == 200
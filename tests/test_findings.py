@@ -0,0 +1,35 @@
+from findings import finding_labels, parse_finding, strip_confidence
+
+
+def test_parse_finding_splits_label_and_confidence():
+    assert parse_finding("Early Blight (Alternaria solani) - 85%") == ("early blight", 85.0)
+
+
+def test_parse_finding_without_confidence():
+    assert parse_finding("Septoria Leaf Spot") == ("septoria leaf spot", None)
+
+
+def test_parse_finding_decimal_confidence_and_colon_detail():
+    assert parse_finding("Magnesium (Mg): interveinal chlorosis 12.5%") == ("magnesium", 12.5)
+
+
+def test_parse_finding_dash_detail_is_dropped():
+    assert parse_finding("Flea Beetles - shot holes - 15%") == ("flea beetles", 15.0)
+
+
+def test_parse_finding_non_string():
+    assert parse_finding(42) == ("42", None)
+
+
+def test_strip_confidence_keeps_display_text():
+    assert strip_confidence("Early Blight (Alternaria solani) - 85%") == "Early Blight (Alternaria solani)"
+
+
+def test_finding_labels_skips_empty_entries():
+    result = {"diseases_identified": ["Early Blight - 80%", "", "early blight - 60%", "Late Blight"]}
+    assert finding_labels(result, "pathology") == {"early blight", "late blight"}
+
+
+def test_finding_labels_missing_or_null_field():
+    assert finding_labels({}, "nutrition") == set()
+    assert finding_labels({"stress_factors": None}, "environmental") == set()
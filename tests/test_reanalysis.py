@@ -0,0 +1,142 @@
+import copy
+import dataclasses
+
+import pytest
+
+import prompts
+from agents import TomatoAnalysisAgent
+from backends import BackendRouter
+from preprocess import PreparedImage
+from prompts import AGENT_PROMPTS
+
+IMAGE = PreparedImage.from_payload(["aW1hZ2U="])
+
+STORED = {
+    "pathology": {"agent_name": "Plant Pathology Specialist", "diseases_identified": ["Early Blight - 80%"]},
+    "entomology": {"agent_name": "Entomology Specialist", "pest_damage_detected": []},
+    "nutrition": {"agent_name": "Plant Nutrition Specialist", "nutrient_deficiencies": ["Magnesium - 30%"]},
+    "environmental": {"agent_name": "Environmental Stress Specialist", "stress_factors": []},
+    "treatment": {"agent_name": "Treatment Coordinator", "priority_treatments": ["Remove lower leaves"]},
+}
+
+
+class FakeAgent(TomatoAnalysisAgent):
+    """Answers from `outputs` instead of calling a backend and records which agents ran"""
+
+    def __init__(self, outputs=None):
+        super().__init__(router=BackendRouter.single("sk-test"))
+        self.outputs = copy.deepcopy(outputs or STORED)
+        self.calls = []
+
+    def _answer(self, agent_key):
+        self.calls.append(agent_key)
+        self.usage[agent_key] = {"prompt_tokens": 1000, "completion_tokens": 100, "cached_tokens": 0,
+                                 "calls": 1, "backend": "openai", "model": "gpt-4o"}
+        return copy.deepcopy(self.outputs[agent_key])
+
+    def _run_vision_agent(self, agent_key, image):
+        return self._answer(agent_key)
+
+    def pathology_agent(self, image, samples=1, quorum=None):
+        return self._answer("pathology")
+
+    def treatment_agent(self, pathology_data, entomology_data, nutrition_data, environmental_data):
+        return self._answer("treatment")
+
+
+@pytest.fixture
+def previous():
+    agent = FakeAgent()
+    stored = copy.deepcopy(STORED)
+    stored["fingerprints"] = agent.fingerprints()
+    stored["usage"] = {key: {"prompt_tokens": 1000, "completion_tokens": 100, "calls": 1, "model": "gpt-4o"}
+                       for key in AGENT_PROMPTS}
+    stored["analysis_timestamp"] = "2026-01-01T00:00:00"
+    return stored
+
+
+def test_up_to_date_analysis_is_not_stale(previous):
+    assert FakeAgent().stale_agents(previous) == []
+
+
+def test_changed_fingerprint_is_stale(previous):
+    previous["fingerprints"]["nutrition"] = "0" * 16
+    assert FakeAgent().stale_agents(previous) == ["nutrition"]
+
+
+def test_prompt_change_changes_only_that_agents_fingerprint(monkeypatch, previous):
+    changed = dataclasses.replace(AGENT_PROMPTS["entomology"], version=AGENT_PROMPTS["entomology"].version + 1)
+    monkeypatch.setitem(prompts.AGENT_PROMPTS, "entomology", changed)
+    assert FakeAgent().stale_agents(previous) == ["entomology"]
+
+
+def test_errored_result_is_stale(previous):
+    previous["entomology"] = {"error": "timeout", "agent_name": "Entomology Specialist"}
+    assert FakeAgent().stale_agents(previous) == ["entomology"]
+
+
+def test_missing_agent_is_stale(previous):
+    del previous["environmental"]
+    del previous["fingerprints"]["treatment"]
+    assert FakeAgent().stale_agents(previous) == ["environmental", "treatment"]
+
+
+def test_pathology_sample_count_is_part_of_its_fingerprint(previous):
+    agent = FakeAgent()
+    assert agent.stale_agents(previous, pathology_samples=3) == ["pathology"]
+
+    previous["pathology"]["ensemble"] = {"requested": 3}
+    previous["fingerprints"]["pathology"] = agent.fingerprints(3)["pathology"]
+    assert agent.previous_samples(previous) == 3
+    assert agent.stale_agents(previous) == []
+
+
+def test_reanalyze_reuses_treatment_when_recomputed_inputs_are_unchanged(previous):
+    previous["fingerprints"]["nutrition"] = "0" * 16
+    agent = FakeAgent()
+    results = agent.reanalyze(IMAGE, previous)
+
+    assert agent.calls == ["nutrition"]
+    assert results["reanalysis"]["recomputed"] == ["nutrition"]
+    assert results["treatment"] == previous["treatment"]
+    assert results["usage"]["treatment"]["reused"] is True
+    assert "reused" not in results["usage"]["nutrition"]
+    assert results["fingerprints"] == agent.fingerprints()
+
+
+def test_reanalyze_reruns_treatment_when_an_input_changes(previous):
+    previous["fingerprints"]["nutrition"] = "0" * 16
+    outputs = copy.deepcopy(STORED)
+    outputs["nutrition"]["nutrient_deficiencies"] = ["Nitrogen - 70%"]
+    outputs["treatment"] = {"agent_name": "Treatment Coordinator", "priority_treatments": ["Side-dress nitrogen"]}
+    agent = FakeAgent(outputs)
+    results = agent.reanalyze(IMAGE, previous)
+
+    assert agent.calls == ["nutrition", "treatment"]
+    assert results["reanalysis"]["recomputed"] == ["nutrition", "treatment"]
+    assert results["treatment"]["priority_treatments"] == ["Side-dress nitrogen"]
+    assert sorted(results["reanalysis"]["reused"]) == ["entomology", "environmental", "pathology"]
+
+
+def test_reanalyze_ignores_ensemble_bookkeeping_when_comparing_inputs(previous):
+    previous["pathology"]["ensemble"] = {"requested": 1, "completed": 1}
+    previous["fingerprints"]["pathology"] = "0" * 16
+    agent = FakeAgent()
+    results = agent.reanalyze(IMAGE, previous)
+    assert agent.calls == ["pathology"]
+    assert results["treatment"] == previous["treatment"]
+
+
+def test_reanalyze_reruns_only_treatment_when_its_fingerprint_changes(previous):
+    previous["fingerprints"]["treatment"] = "0" * 16
+    agent = FakeAgent()
+    results = agent.reanalyze(IMAGE, previous)
+    assert agent.calls == ["treatment"]
+    assert results["reanalysis"]["recomputed"] == ["treatment"]
+
+
+def test_reanalyze_force_reruns_everything(previous):
+    agent = FakeAgent()
+    results = agent.reanalyze(IMAGE, previous, force=True)
+    assert agent.calls == ["pathology", "entomology", "nutrition", "environmental", "treatment"]
+    assert results["reanalysis"]["reused"] == []
@@ -0,0 +1,203 @@
+"""Video walk-through ingestion with keyframe selection.
+
+A scout films a row instead of photographing leaves one by one. Frames are
+decoded as a stream and sampled at a fixed rate. Each sampled frame is scored
+for sharpness (variance of the Laplacian) and leaf coverage (the leaf mask
+from preprocess). Near-duplicates are dropped by perceptual hash, and only
+the best K distinct keyframes are held in memory at any time. Those
+keyframes then go through the agent pipeline on a bounded worker pool, and
+every result keeps the timestamp of its frame.
+
+Decoding uses PyAV (``pip install av``), which is only imported when a video
+is actually opened.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from agents import TomatoAnalysisAgent
+from backends import BackendRouter
+from preprocess import leaf_mask, prepare_leaf_image
+
+VIDEO_TYPES = ["mp4", "mov", "m4v", "webm", "avi", "mkv"]
+
+# Keyframes are kept at this long side; the agents never need more
+KEYFRAME_SIDE = 1536
+# Scoring and hashing run on a small copy of each frame
+SCORE_SIDE = 384
+HASH_SIZE = 8
+_DCT_SIZE = 32
+
+
+@dataclass
+class Keyframe:
+    """A selected video frame and why it was selected"""
+    timestamp: float
+    image: Image.Image
+    sharpness: float
+    leaf_coverage: float
+    score: float
+    phash: int
+
+
+def _import_av():
+    try:
+        import av
+    except ImportError as e:
+        raise ImportError("Video ingestion requires PyAV: pip install av") from e
+    return av
+
+
+def iter_frames(source: Union[str, BinaryIO], sample_fps: float = 2.0, keyframes_only: bool = False,
+                max_side: int = KEYFRAME_SIDE) -> Iterator[Tuple[float, Image.Image]]:
+    """Yield (timestamp seconds, RGB frame) at roughly `sample_fps`, decoding as a stream.
+
+    With `keyframes_only` the decoder skips everything but intra frames, which
+    is much faster on long clips at the cost of temporal resolution.
+    """
+    av = _import_av()
+    container = av.open(source)
+    try:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        if keyframes_only:
+            stream.codec_context.skip_frame = "NONKEY"
+
+        # Timestamps are relative to the start of the clip, as in a player; MPEG-TS
+        # and some phone recordings start their presentation clock well above 0
+        start = float(stream.start_time * stream.time_base) if stream.start_time is not None else 0.0
+        interval = 1.0 / sample_fps if sample_fps > 0 else 0.0
+        next_time = 0.0
+
+        for frame in container.decode(stream):
+            timestamp = float(frame.time) - start if frame.time is not None else next_time
+            if timestamp + 1e-6 < next_time:
+                continue
+            next_time = timestamp + interval
+            # Sized from the decoded frame: some containers report 0x0 until the first decode
+            scale = min(1.0, max_side / max(frame.width, frame.height, 1))
+            width = max(2, int(frame.width * scale) // 2 * 2)
+            height = max(2, int(frame.height * scale) // 2 * 2)
+            # Scale in libswscale so full-resolution RGB frames are never materialized
+            yield timestamp, frame.to_image(width=width, height=height)
+    finally:
+        container.close()
+
+
+def sharpness(gray: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian; low values mean motion blur or defocus"""
+    gray = gray.astype(np.float32)
+    laplacian = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4.0 * gray[1:-1, 1:-1]
+    )
+    return float(laplacian.var())
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def phash(image: Image.Image) -> int:
+    """64-bit DCT perceptual hash"""
+    small = np.asarray(image.convert("L").resize((_DCT_SIZE, _DCT_SIZE), Image.BILINEAR), dtype=np.float32)
+    coefficients = (_DCT @ small @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    # Compare against the median of the AC terms so overall brightness does not matter
+    bits = coefficients > np.median(coefficients[1:])
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def score_frame(timestamp: float, image: Image.Image) -> Keyframe:
+    small = image.copy()
+    small.thumbnail((SCORE_SIDE, SCORE_SIDE))
+    frame_sharpness = sharpness(np.asarray(small.convert("L")))
+    coverage = float(leaf_mask(small).mean())
+    return Keyframe(
+        timestamp=timestamp,
+        image=image,
+        sharpness=frame_sharpness,
+        leaf_coverage=coverage,
+        # log keeps a very crisp but mostly-soil frame from beating a good leaf shot
+        score=float(np.log1p(frame_sharpness) * coverage),
+        phash=phash(small),
+    )
+
+
+def select_keyframes(frames: Iterator[Tuple[float, Image.Image]], top_k: int = 5,
+                     min_coverage: float = 0.05, duplicate_distance: int = 10) -> List[Keyframe]:
+    """Keep the `top_k` best-scoring, mutually distinct frames from a frame stream.
+
+    Memory is bounded by `top_k` frames. A near-duplicate of a kept frame
+    replaces it only if it scores higher; a distinct frame evicts the lowest
+    scorer once the pool is full.
+    """
+    kept: List[Keyframe] = []
+    for timestamp, image in frames:
+        candidate = score_frame(timestamp, image)
+        if candidate.leaf_coverage < min_coverage:
+            continue
+
+        duplicates = [k for k in kept if hamming(k.phash, candidate.phash) <= duplicate_distance]
+        if duplicates:
+            if all(candidate.score > k.score for k in duplicates):
+                kept = [k for k in kept if k not in duplicates]
+                kept.append(candidate)
+            continue
+
+        if len(kept) < top_k:
+            kept.append(candidate)
+        else:
+            worst = min(kept, key=lambda k: k.score)
+            if candidate.score > worst.score:
+                kept.remove(worst)
+                kept.append(candidate)
+    return sorted(kept, key=lambda k: k.timestamp)
+
+
+def analyze_keyframes(router: BackendRouter, keyframes: List[Keyframe], max_workers: int = 2,
+                      tiles: int = 0,
+                      on_result: Optional[Callable[[int, int], None]] = None) -> List[Dict[str, Any]]:
+    """Run the multi-agent pipeline on each keyframe with at most `max_workers` in flight.
+
+    `on_result(done, total)` is called as each keyframe finishes. Results are
+    returned in timestamp order.
+    """
+    def analyze(keyframe: Keyframe) -> Dict[str, Any]:
+        # Agents keep per-analysis usage, so each worker needs its own
+        agent = TomatoAnalysisAgent(router=router)
+        prepared = prepare_leaf_image(keyframe.image, tiles=tiles)
+        return {
+            "timestamp": keyframe.timestamp,
+            "sharpness": round(keyframe.sharpness, 1),
+            "leaf_coverage": round(keyframe.leaf_coverage, 3),
+            "score": round(keyframe.score, 3),
+            "results": agent.run_multi_agent_analysis(prepared),
+        }
+
+    analyses = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = [pool.submit(analyze, keyframe) for keyframe in keyframes]
+        for done, future in enumerate(as_completed(futures), start=1):
+            analyses.append(future.result())
+            if on_result is not None:
+                on_result(done, len(futures))
+    return sorted(analyses, key=lambda a: a["timestamp"])
+
+
+def format_timestamp(seconds: float) -> str:
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes):02d}:{seconds:04.1f}"